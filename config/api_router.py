@@ -7,6 +7,7 @@ from rest_framework_nested.routers import NestedSimpleRouter
 from life.users.api.viewsets.lsg import DistrictViewSet, LocalBodyViewSet, StateViewSet, WardViewSet
 from life.users.api.viewsets.users import UserViewSet
 
+from life.app.api.viewsets.job import JobViewSet
 from life.app.api.viewsets.lifedata import LifeDataViewSet
 
 if settings.DEBUG:
@@ -15,6 +16,7 @@ else:
     router = SimpleRouter()
 
 router.register("life/data", LifeDataViewSet)
+router.register("life/jobs", JobViewSet)
 
 router.register("users", UserViewSet)
 
@@ -94,7 +94,7 @@ THIRD_PARTY_APPS = [
     "django_rest_passwordreset",
 ]
 
-LOCAL_APPS = ["life.users.apps.UsersConfig", "life.app"]
+LOCAL_APPS = ["life.users.apps.UsersConfig", "life.app.apps.LifeConfig"]
 # https://docs.djangoproject.com/en/dev/ref/settings/#installed-apps
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
@@ -412,6 +412,55 @@ LIFE_S3_ACCESS_KEY = env("LIFE_S3_ACCESS_KEY", default="")
 LIFE_S3_SECRET = env("LIFE_S3_SECRET", default="")
 LIFE_S3_BUCKET = env("LIFE_S3_BUCKET", default="")
 
+LIFE_INGEST_BATCH_SIZE = int(env("LIFE_INGEST_BATCH_SIZE", default="500"))
+# Maximum number of jobs being processed at the same time across all workers
+LIFE_JOB_CONCURRENCY = int(env("LIFE_JOB_CONCURRENCY", default="4"))
+# WORKING jobs without a heartbeat for LIFE_JOB_HEARTBEAT_TIMEOUT seconds are retried with a backoff,
+# and marked as FAILED after LIFE_JOB_MAX_ATTEMPTS attempts
+LIFE_JOB_HEARTBEAT_INTERVAL = int(env("LIFE_JOB_HEARTBEAT_INTERVAL", default="30"))
+LIFE_JOB_HEARTBEAT_TIMEOUT = int(env("LIFE_JOB_HEARTBEAT_TIMEOUT", default="600"))
+LIFE_JOB_MAX_ATTEMPTS = int(env("LIFE_JOB_MAX_ATTEMPTS", default="5"))
+# Maximum number of errors stored for a job run, further errors are only counted
+LIFE_JOB_MAX_ERRORS = int(env("LIFE_JOB_MAX_ERRORS", default="1000"))
+# Number of JobRun records kept per job
+LIFE_JOB_RUN_HISTORY = int(env("LIFE_JOB_RUN_HISTORY", default="200"))
+# Sources of due jobs are downloaded concurrently by the scheduler and handed to the workers through the cache
+LIFE_PREFETCH_CONNECTIONS = int(env("LIFE_PREFETCH_CONNECTIONS", default="20"))
+LIFE_PREFETCH_CONNECTIONS_PER_HOST = int(env("LIFE_PREFETCH_CONNECTIONS_PER_HOST", default="4"))
+LIFE_PREFETCH_CONNECT_TIMEOUT = int(env("LIFE_PREFETCH_CONNECT_TIMEOUT", default="10"))  # in Seconds
+LIFE_PREFETCH_RETRIES = int(env("LIFE_PREFETCH_RETRIES", default="2"))
+LIFE_PREFETCH_MAX_SIZE = int(env("LIFE_PREFETCH_MAX_SIZE", default="10"))  # in MB, larger sources are not prefetched
+LIFE_PREFETCH_CACHE_TIMEOUT = int(env("LIFE_PREFETCH_CACHE_TIMEOUT", default="600"))  # in Seconds
+# Sources not prefetched within LIFE_PREFETCH_TIMEOUT are downloaded by the workers, it has to stay well below
+# LIFE_JOB_HEARTBEAT_TIMEOUT since the heartbeat of the jobs is not updated while they are prefetched
+LIFE_PREFETCH_TIMEOUT = int(env("LIFE_PREFETCH_TIMEOUT", default="120"))  # in Seconds
+# Downloaded sources are stored gzipped to be reprocessed without being downloaded again,
+# either "s3" in LIFE_SNAPSHOT_BUCKET or "local" in LIFE_SNAPSHOT_DIR, any other value disables snapshots.
+# "local" is only usable when every worker shares LIFE_SNAPSHOT_DIR, e.g. in development
+LIFE_SNAPSHOT_STORAGE = env("LIFE_SNAPSHOT_STORAGE", default="")
+LIFE_SNAPSHOT_BUCKET = env("LIFE_SNAPSHOT_BUCKET", default="")
+LIFE_SNAPSHOT_DIR = env("LIFE_SNAPSHOT_DIR", default=str(ROOT_DIR.path("snapshots")))
+# Snapshots older than LIFE_SNAPSHOT_RETENTION days are deleted, unless they are the last source of a job
+LIFE_SNAPSHOT_RETENTION = int(env("LIFE_SNAPSHOT_RETENTION", default="30"))  # in Days
+# Time a dry run validation of a source may take, including its download
+LIFE_VALIDATE_TIME_BUDGET = int(env("LIFE_VALIDATE_TIME_BUDGET", default="10"))  # in Seconds
+# Jobs with adaptive periodicity double their interval after LIFE_ADAPTIVE_UNCHANGED_RUNS runs without a change
+# of their source and halve it whenever it changed, between the min and max periodicity
+LIFE_ADAPTIVE_UNCHANGED_RUNS = int(env("LIFE_ADAPTIVE_UNCHANGED_RUNS", default="3"))
+LIFE_ADAPTIVE_MIN_PERIODICITY = int(env("LIFE_ADAPTIVE_MIN_PERIODICITY", default="5"))  # in Mins
+LIFE_ADAPTIVE_MAX_PERIODICITY = int(env("LIFE_ADAPTIVE_MAX_PERIODICITY", default="720"))  # in Mins
+# CSV sources of jobs with sharded_ingest are split into shards of LIFE_SHARD_SIZE ingested in parallel,
+# the shards are handed to the workers through the cache
+LIFE_SHARD_SIZE = int(env("LIFE_SHARD_SIZE", default="4"))  # in MB
+# Exports are streamed from the database LIFE_EXPORT_CHUNK_SIZE rows at a time into multipart uploads,
+# parts have to be at least 5 MB for S3
+LIFE_EXPORT_CHUNK_SIZE = int(env("LIFE_EXPORT_CHUNK_SIZE", default="2000"))
+LIFE_EXPORT_PART_SIZE = int(env("LIFE_EXPORT_PART_SIZE", default="8"))  # in MB
+# Exports are also uploaded gzipped and brotli compressed, as {category}.json.gz, {category}.json.br, ...
+LIFE_EXPORT_GZIP_LEVEL = int(env("LIFE_EXPORT_GZIP_LEVEL", default="9"))
+LIFE_EXPORT_BROTLI_QUALITY = int(env("LIFE_EXPORT_BROTLI_QUALITY", default="9"))
+LIFE_EXPORT_CACHE_CONTROL = env("LIFE_EXPORT_CACHE_CONTROL", default="public, max-age=300")
+
 SQS_AWS_REGION = env("SQS_AWS_REGION", default="")
 SQS_AWS_ACCESS_KEY_ID = env("SQS_AWS_ACCESS_KEY_ID", default="")
 SQS_AWS_SECRET_ACCESS_KEY = env("SQS_AWS_SECRET_ACCESS_KEY", default="")
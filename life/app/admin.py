@@ -1,6 +1,9 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.utils.html import format_html, format_html_join
 
 from life.app.models import Job
+from life.app.tasks.job_executor import reprocess_job
+from life.app.utils.snapshots import check_snapshot
 from django_celery_beat.models import SolarSchedule, PeriodicTask, IntervalSchedule, CrontabSchedule, ClockedSchedule
 from allauth.account.models import EmailAddress
 from django_rest_passwordreset.models import ResetPasswordToken
@@ -21,11 +24,112 @@ for model in [
     admin.site.unregister(model)
 
 
+# Number of runs shown in the history of a job
+RUN_HISTORY_SIZE = 50
+RUN_TABLE_SIZE = 10
+RUN_STAGES = [
+    "download",
+    "split",
+    "dispatch",
+    "parse",
+    "validate",
+    "write",
+    "duplicates",
+    "sweep",
+    "snapshot",
+    "save",
+    "email",
+]
+
+
+def sparkline(values, width=200, height=30):
+    """
+    SVG line of the values, oldest first, scaled to the largest value
+    """
+    if len(values) < 2:
+        return ""
+    top = max(values) or 1
+    step = width / (len(values) - 1)
+    points = " ".join(f"{i * step:.1f},{height - value * height / top:.1f}" for i, value in enumerate(values))
+    return format_html(
+        '<svg width="{}" height="{}"><polyline points="{}" fill="none" stroke="#417690" stroke-width="1.5"/></svg>',
+        width,
+        height,
+        points,
+    )
+
+
 class JobAdmin(admin.ModelAdmin):
-    actions = ["silent_delete"]
+    actions = ["silent_delete", "reprocess"]
+    readonly_fields = ["run_history"]
 
     def silent_delete(self, request, queryset):
         queryset.delete()
 
+    def reprocess(self, request, queryset):
+        dispatched = 0
+        skipped = []
+        for job in queryset:
+            try:
+                check_snapshot(job)
+            except Exception as e:
+                skipped.append(f"{job.id} : {e}")
+                continue
+            reprocess_job.delay(job.id)
+            dispatched += 1
+        self.message_user(request, f"{dispatched} jobs will be reprocessed from their last snapshot")
+        if skipped:
+            self.message_user(request, f"Jobs not reprocessed, {', '.join(skipped)}", level=messages.WARNING)
+
+    reprocess.short_description = "Reprocess from the last snapshot"
+
+    def run_history(self, obj):
+        runs = list(reversed(obj.runs.order_by("-id")[:RUN_HISTORY_SIZE]))
+        if not runs:
+            return "-"
+        trends = format_html_join(
+            "",
+            "<tr><th>{}</th><td>{}</td><td>{}</td></tr>",
+            (
+                (label, sparkline([getattr(run, field) for run in runs]), getattr(runs[-1], field))
+                for label, field in [
+                    ("Duration (s)", "duration"),
+                    ("Rows", "rows"),
+                    ("Queries", "queries"),
+                    ("Bytes downloaded", "bytes_downloaded"),
+                    ("Errors", "errors"),
+                ]
+            ),
+        )
+        stage_headers = format_html_join("", "<th>{}</th>", ((stage,) for stage in RUN_STAGES))
+        stage_rows = format_html_join(
+            "",
+            "<tr><td>{}</td><td>{}</td><td>{}</td>{}</tr>",
+            (
+                (
+                    run.created_date,
+                    run.rows,
+                    run.duration,
+                    format_html_join(
+                        "",
+                        "<td>{} s / {} q</td>",
+                        (
+                            (run.stages.get(stage, {}).get("duration", 0), run.stages.get(stage, {}).get("queries", 0))
+                            for stage in RUN_STAGES
+                        ),
+                    ),
+                )
+                for run in reversed(runs[-RUN_TABLE_SIZE:])
+            ),
+        )
+        return format_html(
+            "<table>{}</table><table><tr><th>Finished</th><th>Rows</th><th>Duration (s)</th>{}</tr>{}</table>",
+            trends,
+            stage_headers,
+            stage_rows,
+        )
+
+    run_history.short_description = "Run history"
+
 
 admin.site.register(Job, JobAdmin)
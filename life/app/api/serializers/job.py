@@ -0,0 +1,34 @@
+from rest_framework import serializers
+
+from life.app.models import Job, JobError
+
+
+class JobErrorSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = JobError
+        fields = ("row", "field", "code", "message")
+
+
+class JobValidationSerializer(serializers.Serializer):
+    file = serializers.FileField(required=False)
+    file_url = serializers.URLField(required=False)
+    mapping_profile = serializers.JSONField(required=False)
+
+    def validate_file(self, file):
+        max_size = Job._meta.get_field("max_download_size").default
+        if file.size > max_size * 1024 * 1024:
+            raise serializers.ValidationError(f"File is larger than the maximum allowed size of {max_size} MB")
+        return file
+
+    def validate(self, attrs):
+        if bool(attrs.get("file")) == bool(attrs.get("file_url")):
+            raise serializers.ValidationError("Either a file or a file_url is required")
+        return attrs
+
+
+class JobValidationResultSerializer(serializers.Serializer):
+    rows = serializers.IntegerField()
+    valid_rows = serializers.IntegerField()
+    complete = serializers.BooleanField()
+    counts = serializers.DictField(child=serializers.IntegerField())
+    errors = JobErrorSerializer(many=True)
@@ -19,4 +19,4 @@ class LifeDataSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = LifeData
-        exclude = TIMESTAMP_FIELDS + ("id",)
+        exclude = TIMESTAMP_FIELDS + ("id", "data_hash", "generation", "changed_generation", "source_row")
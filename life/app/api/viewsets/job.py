@@ -0,0 +1,76 @@
+import time
+
+from django.conf import settings
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.viewsets import GenericViewSet
+
+from life.app.api.serializers.job import JobErrorSerializer, JobValidationResultSerializer, JobValidationSerializer
+from life.app.models import Job, JobErrorCode
+from life.app.tasks.job_executor import validate_source
+from life.app.utils.errors import REPORTED_ERRORS, ErrorLog
+from life.app.utils.sources import DownloadedSource, check_public_url, fetch_source, get_public_session
+
+from config.auth_views import CaptchaRequiredException
+from config.ratelimit import ratelimit
+
+
+def open_validation_source(data, deadline):
+    if data.get("file"):
+        file = data["file"]
+        return DownloadedSource(file, "", size=file.size, content_type=file.content_type or "", url=file.name)
+    check_public_url(data["file_url"])
+    with get_public_session() as session:
+        job = Job(file_url=data["file_url"], read_timeout=settings.LIFE_VALIDATE_TIME_BUDGET)
+        return fetch_source(job, session=session, deadline=deadline)
+
+
+class JobViewSet(GenericViewSet):
+    queryset = Job.objects.all()
+    permission_classes = []
+    authentication_classes = []
+    lookup_field = "external_id"
+
+    @swagger_auto_schema(method="get", responses={200: JobErrorSerializer(many=True)})
+    @action(detail=True, methods=["GET"])
+    def errors(self, request, *args, **kwargs):
+        """
+        Errors of the last run of the job, optionally filtered by error code with ?code=
+        """
+        job = self.get_object()
+        queryset = job.errors.all().order_by("id")
+        code = request.query_params.get("code")
+        if code:
+            queryset = queryset.filter(code=code)
+        page = self.paginate_queryset(queryset)
+        response = self.get_paginated_response(JobErrorSerializer(page, many=True).data)
+        response.data["counts"] = job.error_counts
+        return response
+
+    @swagger_auto_schema(
+        method="post", request_body=JobValidationSerializer(), responses={200: JobValidationResultSerializer()}
+    )
+    @action(detail=False, methods=["POST"])
+    def validate(self, request, *args, **kwargs):
+        """
+        Dry run of the ingestion of a sheet, uploaded as file or downloaded from file_url. Nothing is written,
+        rows are checked until LIFE_VALIDATE_TIME_BUDGET runs out and complete is false if it did.
+        The download counts towards the budget, it fails if the file could not be downloaded within it.
+        """
+        if ratelimit(request, "job-validate", ["ip"]):
+            raise CaptchaRequiredException
+        serializer = JobValidationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        deadline = time.monotonic() + settings.LIFE_VALIDATE_TIME_BUDGET
+        errors = ErrorLog()
+        counts = {"rows": 0, "valid_rows": 0, "complete": True}
+        try:
+            source = open_validation_source(serializer.validated_data, deadline)
+        except Exception as e:
+            errors.add(JobErrorCode.DOWNLOAD_FAILED, f"Could not download file : {e} ")
+        else:
+            with source:
+                errors, counts = validate_source(source, deadline, serializer.validated_data.get("mapping_profile"))
+        result = {**counts, "counts": dict(errors.counts), "errors": errors.errors[:REPORTED_ERRORS]}
+        return Response(JobValidationResultSerializer(result).data)
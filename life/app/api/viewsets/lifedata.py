@@ -10,6 +10,7 @@ from rest_framework_simplejwt.exceptions import AuthenticationFailed
 
 from life.app.api.serializers.lifedata import LifeDataSerializer
 from life.app.models import LifeData
+from life.app.utils.exports import mark_categories_changed
 
 from config.ratelimit import validatecaptcha
 from config.auth_views import CaptchaRequiredException
@@ -29,7 +30,10 @@ class LifeDataViewSet(GenericViewSet):
             raise CaptchaRequiredException
         external_id = kwargs["external_id"]
         try:
-            LifeData.objects.filter(external_id=external_id).update(downvotes=F("downvotes") + 1)
+            if LifeData.objects.filter(external_id=external_id).update(downvotes=F("downvotes") + 1):
+                mark_categories_changed(
+                    LifeData.objects.filter(external_id=external_id).values_list("category", flat=True)
+                )
         except:
             pass
 
@@ -42,7 +46,10 @@ class LifeDataViewSet(GenericViewSet):
             raise CaptchaRequiredException
         external_id = kwargs["external_id"]
         try:
-            LifeData.objects.filter(external_id=external_id).update(upvotes=F("upvotes") + 1)
+            if LifeData.objects.filter(external_id=external_id).update(upvotes=F("upvotes") + 1):
+                mark_categories_changed(
+                    LifeData.objects.filter(external_id=external_id).values_list("category", flat=True)
+                )
         except:
             pass
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -3,7 +3,7 @@ from django.utils.translation import gettext_lazy as _
 
 
 class LifeConfig(AppConfig):
-    name = "app"
+    name = "life.app"
     verbose_name = _("Life Tools")
 
     def ready(self):
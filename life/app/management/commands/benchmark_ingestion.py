@@ -0,0 +1,108 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from life.app.models import Job, LifeData
+from life.app.tasks.job_executor import parse_file, save_life_data
+from life.app.utils.benchmark import (
+    compare_results,
+    create_locations,
+    generate_csv,
+    load_locations,
+    measure,
+    mock_s3,
+    serve_files,
+)
+
+
+class Command(BaseCommand):
+    """
+    Management command to benchmark job ingestion and the export of Life Data.
+    Synthetic sheets are served from a local HTTP server and ingested into a throwaway test database.
+    Usage: python manage.py benchmark_ingestion --sizes 1000 10000 --save-baseline .benchmarks/ingestion.json
+    """
+
+    help = "Benchmarks ingestion and export on synthetic sheets"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 100000], help="rows per sheet")
+        parser.add_argument(
+            "--locations",
+            default=str(settings.ROOT_DIR.path("data", "india", "states-and-districts.json")),
+            help="states and districts JSON the sheets are generated from",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--save-baseline", help="path to write the results to")
+        parser.add_argument("--compare", help="path of a baseline to compare the results with")
+        parser.add_argument("--tolerance", type=float, default=10, help="allowed change in % before a regression")
+        parser.add_argument("--keepdb", action="store_true", help="reuse the test database between runs")
+
+    def handle(self, *args, **options):
+        locations = load_locations(options["locations"])
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options["keepdb"])
+        try:
+            create_locations(locations)
+            with serve_files() as (files, base_url), mock_s3():
+                results = {}
+                for size in sorted(options["sizes"]):
+                    results[str(size)] = self.run_size(size, locations, options["seed"], files, base_url)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options["keepdb"])
+
+        for size, stages in results.items():
+            for stage, metrics in stages.items():
+                self.stdout.write(
+                    f"{size:>8} rows {stage:<10} {metrics['rows_per_second']:>10} rows/s "
+                    f"{metrics['queries']:>8} queries {metrics['peak_rss_mb']:>8} MB peak RSS"
+                )
+
+        if options["save_baseline"]:
+            os.makedirs(os.path.dirname(os.path.abspath(options["save_baseline"])), exist_ok=True)
+            with open(options["save_baseline"], "w") as baseline_file:
+                json.dump(results, baseline_file, indent=2)
+
+        if options["compare"]:
+            with open(options["compare"], "r") as baseline_file:
+                baseline = json.load(baseline_file)
+            regressions = 0
+            for size, stage, metric, old, new, change, regression in compare_results(
+                baseline, results, options["tolerance"]
+            ):
+                regressions += regression
+                self.stdout.write(
+                    f"{size:>8} rows {stage:<10} {metric:<16} {old:>10} -> {new:>10} ({change:+}%)"
+                    f"{' REGRESSION' if regression else ''}"
+                )
+            if regressions:
+                raise CommandError(f"{regressions} metrics regressed by more than {options['tolerance']}% ")
+
+    def run_size(self, size, locations, seed, files, base_url):
+        """
+        Ingests a sheet, ingests an edited revision of it and exports the result
+        """
+        LifeData.objects.all().delete()
+        Job.objects.all().delete()
+        path = f"/sheet-{size}.csv"
+        job = Job.objects.create(
+            file_url=f"{base_url}{path}",
+            name=f"Benchmark {size}",
+            contact_email="benchmark@example.com",
+            suppress_emails=True,
+        )
+        stages = {"ingest": {}, "reingest": {}, "export": {}}
+
+        files[path] = generate_csv(size, locations, seed)
+        with measure(size, stages["ingest"]):
+            parse_file(job)
+
+        files[path] = generate_csv(size, locations, seed, revision=1)
+        with measure(size, stages["reingest"]):
+            parse_file(job)
+
+        with measure(LifeData.objects.count(), stages["export"]):
+            save_life_data()
+        return stages
@@ -1,15 +1,22 @@
 from django.core.management.base import BaseCommand
 
-from life.app.tasks.job_executor import run_jobs
+from life.app.models import Job
+from life.app.tasks.job_executor import claim_jobs, execute_job
+from life.app.utils.prefetch import prefetch_sources
 
 
 class Command(BaseCommand):
     """
     Management command to Force run Jobs.
+    Due jobs are claimed and their sources prefetched like the scheduler does, but they are run in this process.
+    Every due job is run, LIFE_JOB_CONCURRENCY only caps the jobs run by workers.
     """
 
-    help = "Force run jobs"
+    help = "Force run all due jobs, regardless of LIFE_JOB_CONCURRENCY"
 
     def handle(self, *args, **options):
-        run_jobs()
+        jobs = list(Job.objects.filter(id__in=claim_jobs(capped=False)))
+        prefetch_sources(jobs)
+        for job in jobs:
+            execute_job(job.id)
 
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from life.app.models import Job
+from life.app.tasks.job_executor import reprocess_job
+from life.app.utils.snapshots import check_snapshot
+
+
+class Command(BaseCommand):
+    """
+    Management command to reprocess jobs from the snapshot of their last processed source, without downloading it.
+    Usage: python manage.py reprocess_job 12 14, or python manage.py reprocess_job --all --async
+    """
+
+    help = "Reprocess jobs from their last snapshot"
+
+    def add_arguments(self, parser):
+        parser.add_argument("job_ids", nargs="*", type=int)
+        parser.add_argument("--all", action="store_true", help="reprocess every job that has been processed")
+        parser.add_argument("--async", action="store_true", dest="run_async", help="dispatch the jobs to the workers")
+
+    def handle(self, *args, **options):
+        job_ids = options["job_ids"]
+        if options["all"]:
+            job_ids = Job.objects.exclude(source_hash="").values_list("id", flat=True)
+        skipped = []
+        for job_id in job_ids:
+            try:
+                check_snapshot(Job.objects.get(id=job_id))
+            except Exception as e:
+                skipped.append(f"{job_id} : {e}")
+                continue
+            if options["run_async"]:
+                reprocess_job.delay(job_id)
+            else:
+                reprocess_job(job_id)
+        if skipped:
+            raise CommandError(f"Jobs not reprocessed, {', '.join(skipped)}")
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.11 on 2026-10-18 11:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_auto_20210518_2025'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='max_download_size',
+            field=models.IntegerField(default=50),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='read_timeout',
+            field=models.IntegerField(default=60),
+        ),
+    ]
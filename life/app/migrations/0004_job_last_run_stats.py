@@ -0,0 +1,19 @@
+# Generated by Django 2.2.11 on 2026-10-18 11:39
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_job_download_limits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='last_run_stats',
+            field=django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.11 on 2026-10-18 11:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_job_last_run_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='source_etag',
+            field=models.CharField(blank=True, default='', max_length=1024),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='source_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='source_last_modified',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.11 on 2026-10-18 11:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_job_source_validators'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lifedata',
+            name='data_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
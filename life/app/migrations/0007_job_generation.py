@@ -0,0 +1,27 @@
+# Generated by Django 2.2.11 on 2026-10-18 11:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_lifedata_data_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='generation',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='lifedata',
+            name='generation',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='lifedata',
+            index=models.Index(fields=['created_job', 'generation'], name='app_lifedat_created_c1021a_idx'),
+        ),
+    ]
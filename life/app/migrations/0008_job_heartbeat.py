@@ -0,0 +1,23 @@
+# Generated by Django 2.2.11 on 2026-10-18 11:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0007_job_generation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="attempts",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="heartbeat",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
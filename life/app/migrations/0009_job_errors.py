@@ -0,0 +1,39 @@
+# Generated by Django 2.2.11 on 2026-10-18 11:51
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='error_counts',
+            field=django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict),
+        ),
+        migrations.CreateModel(
+            name='JobError',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('external_id', models.UUIDField(db_index=True, default=uuid.uuid4, unique=True)),
+                ('created_date', models.DateTimeField(auto_now_add=True, null=True)),
+                ('modified_date', models.DateTimeField(auto_now=True, null=True)),
+                ('deleted', models.BooleanField(default=False)),
+                ('row', models.IntegerField(blank=True, null=True)),
+                ('field', models.CharField(blank=True, default='', max_length=1024)),
+                ('code', models.CharField(choices=[('download_failed', 'DOWNLOAD_FAILED'), ('processing_failed', 'PROCESSING_FAILED'), ('missing_header', 'MISSING_HEADER'), ('invalid_row', 'INVALID_ROW'), ('required', 'REQUIRED'), ('invalid_choice', 'INVALID_CHOICE'), ('unknown_state', 'UNKNOWN_STATE'), ('unknown_district', 'UNKNOWN_DISTRICT')], max_length=100)),
+                ('message', models.TextField()),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='errors', to='app.Job')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
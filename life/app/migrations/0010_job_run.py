@@ -0,0 +1,41 @@
+# Generated by Django 2.2.11 on 2026-10-18 11:54
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_job_errors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('external_id', models.UUIDField(db_index=True, default=uuid.uuid4, unique=True)),
+                ('created_date', models.DateTimeField(auto_now_add=True, null=True)),
+                ('modified_date', models.DateTimeField(auto_now=True, null=True)),
+                ('deleted', models.BooleanField(default=False)),
+                ('duration', models.FloatField(default=0)),
+                ('source_unchanged', models.BooleanField(default=False)),
+                ('bytes_downloaded', models.BigIntegerField(default=0)),
+                ('rows', models.IntegerField(default=0)),
+                ('inserted', models.IntegerField(default=0)),
+                ('updated', models.IntegerField(default=0)),
+                ('unchanged', models.IntegerField(default=0)),
+                ('removed', models.IntegerField(default=0)),
+                ('errors', models.IntegerField(default=0)),
+                ('queries', models.IntegerField(default=0)),
+                ('stages', django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='runs', to='app.Job')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.11 on 2026-10-18 11:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_job_run'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='source_content_type',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='joberror',
+            name='code',
+            field=models.CharField(choices=[('download_failed', 'DOWNLOAD_FAILED'), ('snapshot_failed', 'SNAPSHOT_FAILED'), ('processing_failed', 'PROCESSING_FAILED'), ('missing_header', 'MISSING_HEADER'), ('invalid_row', 'INVALID_ROW'), ('required', 'REQUIRED'), ('invalid_choice', 'INVALID_CHOICE'), ('unknown_state', 'UNKNOWN_STATE'), ('unknown_district', 'UNKNOWN_DISTRICT')], max_length=100),
+        ),
+    ]
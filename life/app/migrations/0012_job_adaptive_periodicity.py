@@ -0,0 +1,28 @@
+# Generated by Django 2.2.11 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_job_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='adaptive_periodicity',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='current_periodicity',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='unchanged_runs',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.11 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_job_adaptive_periodicity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='sharded_ingest',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='lifedata',
+            name='changed_generation',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.11 on 2026-10-18 12:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_sharded_ingest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='checkpoint_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='checkpoint_row',
+            field=models.IntegerField(default=0),
+        ),
+    ]
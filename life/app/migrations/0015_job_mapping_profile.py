@@ -0,0 +1,19 @@
+# Generated by Django 2.2.11 on 2026-10-18 12:08
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_job_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='mapping_profile',
+            field=django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict),
+        ),
+    ]
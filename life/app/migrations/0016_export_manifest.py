@@ -0,0 +1,31 @@
+# Generated by Django 2.2.11 on 2026-10-18 12:12
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_job_mapping_profile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportManifest',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('external_id', models.UUIDField(db_index=True, default=uuid.uuid4, unique=True)),
+                ('created_date', models.DateTimeField(auto_now_add=True, null=True)),
+                ('modified_date', models.DateTimeField(auto_now=True, null=True)),
+                ('deleted', models.BooleanField(default=False)),
+                ('category', models.CharField(max_length=1024, unique=True)),
+                ('version', models.BigIntegerField(default=0)),
+                ('exported_version', models.BigIntegerField(default=0)),
+                ('exported_date', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
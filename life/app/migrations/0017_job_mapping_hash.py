@@ -0,0 +1,18 @@
+# Generated by Django 2.2.11 on 2026-10-18 12:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_export_manifest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='mapping_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.11 on 2026-10-18 12:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0018_job_snapshot_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lifedata',
+            name='source_row',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -35,11 +35,31 @@ class Job(BaseModel):
     )
     next_runtime = models.DateTimeField(auto_now_add=True)
     periodicity = models.IntegerField(default=10)  # in Mins
+    adaptive_periodicity = models.BooleanField(default=False)  # Adapt the interval between runs to the change rate
+    current_periodicity = models.IntegerField(default=0)  # in Mins, interval of adaptive jobs, 0 until adapted
+    unchanged_runs = models.IntegerField(default=0)  # Runs without a change of the source since the last adaptation
+    sharded_ingest = models.BooleanField(default=False)  # Split large CSV sources and ingest the parts in parallel
+    mapping_profile = JSONField(default=dict, blank=True)  # Header aliases, column bindings and normalizers
     contact_email = models.EmailField()
     last_errors = models.TextField(null=True, blank=True)
     suppress_emails = models.BooleanField(default=False)
     email_periodicity = models.IntegerField(default=10)  # in Mins
     email_next_sendtime = models.DateTimeField(auto_now_add=True)
+    max_download_size = models.IntegerField(default=50)  # in MB
+    read_timeout = models.IntegerField(default=60)  # in Seconds
+    last_run_stats = JSONField(default=dict, blank=True)
+    source_etag = models.CharField(max_length=1024, blank=True, default="")
+    source_last_modified = models.CharField(max_length=255, blank=True, default="")
+    source_hash = models.CharField(max_length=64, blank=True, default="")  # SHA-256 of the last processed file
+    source_content_type = models.CharField(max_length=255, blank=True, default="")
+    mapping_hash = models.CharField(max_length=64, blank=True, default="")  # Of the profile it was processed with
+    snapshot_hash = models.CharField(max_length=64, blank=True, default="")  # SHA-256 of the last stored snapshot
+    generation = models.IntegerField(default=0)  # Incremented on every run that parses the file
+    checkpoint_row = models.IntegerField(default=0)  # Last row written by the current run of the source
+    checkpoint_hash = models.CharField(max_length=64, blank=True, default="")  # SHA-256 of the checkpointed source
+    heartbeat = models.DateTimeField(null=True, blank=True)  # Updated periodically while the job is WORKING
+    attempts = models.IntegerField(default=0)  # Consecutive runs that did not complete
+    error_counts = JSONField(default=dict, blank=True)  # Number of errors of the last run per error code
 
     def __str__(self):
         return f"Job Submitted by {self.contact_email} is currently in {self.status} status, to be next run at {self.next_runtime}"
@@ -50,6 +70,7 @@ class LifeData(BaseModel):
     data_id = models.CharField(max_length=1024, db_index=True, null=False, blank=False)
     category = models.CharField(max_length=1024, db_index=True, default="")
     data = JSONField(default=dict)
+    data_hash = models.CharField(max_length=64, blank=True, default="")  # SHA-256 of the normalised row
     phone_1 = models.CharField(max_length=200)
     district = models.ForeignKey(District, on_delete=models.PROTECT, null=False, blank=False)
     state = models.ForeignKey(State, on_delete=models.PROTECT, null=False, blank=False)
@@ -58,6 +79,57 @@ class LifeData(BaseModel):
     upvotes = models.IntegerField(default=0)
     verifiedAndAvailable = models.IntegerField(default=0)
     verifiedAndUnavailable = models.IntegerField(default=0)
+    generation = models.IntegerField(default=0)  # Generation of the job run that last saw the row
+    changed_generation = models.IntegerField(default=0)  # Generation of the job run that last changed the row
+    source_row = models.IntegerField(default=0)  # Row number in the source of the job run that last wrote the row
+
+    class Meta:
+        indexes = [models.Index(fields=["created_job", "generation"])]
+
+
+class JobRun(BaseModel):
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name="runs")
+    duration = models.FloatField(default=0)  # in Seconds
+    source_unchanged = models.BooleanField(default=False)
+    bytes_downloaded = models.BigIntegerField(default=0)
+    rows = models.IntegerField(default=0)
+    inserted = models.IntegerField(default=0)
+    updated = models.IntegerField(default=0)
+    unchanged = models.IntegerField(default=0)
+    removed = models.IntegerField(default=0)
+    errors = models.IntegerField(default=0)
+    queries = models.IntegerField(default=0)
+    stages = JSONField(default=dict, blank=True)  # Duration in Seconds and number of queries per stage
+
+
+class JobErrorCode(enum.Enum):
+    DOWNLOAD_FAILED = "download_failed"
+    SNAPSHOT_FAILED = "snapshot_failed"
+    PROCESSING_FAILED = "processing_failed"
+    MISSING_HEADER = "missing_header"
+    INVALID_ROW = "invalid_row"
+    REQUIRED = "required"
+    INVALID_CHOICE = "invalid_choice"
+    UNKNOWN_STATE = "unknown_state"
+    UNKNOWN_DISTRICT = "unknown_district"
+
+
+JobErrorCodeChoices = [(e.value, e.name) for e in JobErrorCode]
+
+
+class JobError(BaseModel):
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name="errors")
+    row = models.IntegerField(null=True, blank=True)  # Row number in the file, the header being row 1
+    field = models.CharField(max_length=1024, blank=True, default="")
+    code = models.CharField(choices=JobErrorCodeChoices, max_length=100)
+    message = models.TextField()
+
+
+class ExportManifest(BaseModel):
+    category = models.CharField(max_length=1024, unique=True)
+    version = models.BigIntegerField(default=0)  # Bumped whenever a row of the category is written or deleted
+    exported_version = models.BigIntegerField(default=0)  # Version of the category in the last uploaded export
+    exported_date = models.DateTimeField(null=True, blank=True)
 
 
 from life.app.tasks.job_executor import run_jobs, save_life_data  # Dont Delete
@@ -0,0 +1,27 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from life.app.models import Job
+from life.app.utils.exports import mark_categories_changed
+from life.app.utils.location_resolver import invalidate_location_resolver
+from life.users.models import District, State
+
+
+@receiver(post_save, sender=State)
+@receiver(post_delete, sender=State)
+@receiver(post_save, sender=District)
+@receiver(post_delete, sender=District)
+def location_changed(sender, **kwargs):
+    invalidate_location_resolver()
+
+
+@receiver(pre_delete, sender=Job)
+def job_deleting(sender, instance, **kwargs):
+    # The rows of the job are deleted with it
+    instance.deleted_categories = set(instance.lifedata_set.values_list("category", flat=True).distinct())
+
+
+@receiver(post_delete, sender=Job)
+def job_deleted(sender, instance, **kwargs):
+    # Once its rows are deleted, like every other change of the rows
+    mark_categories_changed(getattr(instance, "deleted_categories", ()))
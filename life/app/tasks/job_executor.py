@@ -1,21 +1,49 @@
+import codecs
 import csv
-import io
+import hashlib
 import json
+import time
+from collections import Counter
 from datetime import timedelta
+from functools import partial
 from os import error
 
 import boto3
-import requests
+from celery import chord, shared_task
 from celery.decorators import periodic_task
 from celery.schedules import crontab
 from django.conf import settings
 from django.core.mail import EmailMessage
+from django.db import connection, transaction
+from django.db.models import Count, Q
 from django.utils.timezone import localtime, now
 from rest_framework import serializers
 
-from life.app.api.serializers.lifedata import LifeDataSerializer
-from life.app.models import Job, JobStatus, LifeData
-from life.users.models import District, State
+from life.app.models import ExportManifest, Job, JobErrorCode, JobRun, JobStatus, LifeData
+from life.app.utils.duplicates import (
+    DeferredDuplicates,
+    DuplicateIndex,
+    get_duplicate_key,
+    normalize_phone,
+    sweep_duplicates,
+)
+from life.app.utils.errors import ErrorLog, RowError
+from life.app.utils.exports import (
+    EXPORT_FIELDS,
+    ExportArtifact,
+    ShardedExport,
+    get_data_keys,
+    iter_export_rows,
+    mark_categories_changed,
+)
+from life.app.utils.instrumentation import RunTimer
+from life.app.utils.location_resolver import get_location_resolver
+from life.app.utils.mapping import compile_mapping, get_mapping_hash
+from life.app.utils.prefetch import get_source, prefetch_sources
+from life.app.utils.readers import CSV, get_source_format, iter_gunzipped_chunks, read_csv_rows, read_source_rows
+from life.app.utils.sharding import delete_shards, get_shard, store_shards
+from life.app.utils.snapshots import load_snapshot, prune_snapshots, save_snapshot, snapshots_enabled
+from life.app.utils.sources import DeadlineFile, TimeBudgetExceeded
 
 rows_header = [
     "id",
@@ -59,6 +87,22 @@ choices_validation = [
     {"key": "category", "choices": ["oxygen", "medicine", "hospital", "ambulance", "helpline", "vaccine", "food"]}
 ]
 
+life_data_update_fields = [
+    "data_id",
+    "category",
+    "data",
+    "phone_1",
+    "district",
+    "state",
+    "is_duplicate",
+    "deleted",
+    "data_hash",
+    "generation",
+    "changed_generation",
+    "source_row",
+    "modified_date",
+]
+
 
 def send_email(file_name, errors, email_id):
     errors = errors.replace("\n", "<br>")
@@ -72,91 +116,587 @@ def send_email(file_name, errors, email_id):
     msg.send()
 
 
-def parse_file(job):
-    job.status = JobStatus.WORKING.value
-    job.save()
-    response = requests.get(job.file_url)
-    decoded_content = response.content.decode("utf-8")
-    csv_rows = csv.reader(decoded_content.splitlines(), delimiter=",")
-    mapping = {}
-    start = 1
-    errors = ""
-    LifeData.objects.filter(created_job=job).update(deleted=True)
-    for row in csv_rows:
+def send_heartbeat(job):
+    """
+    Records that the job is still being worked on, at most once every LIFE_JOB_HEARTBEAT_INTERVAL seconds
+    """
+    current_time = localtime(now())
+    if job.heartbeat and current_time - job.heartbeat < timedelta(seconds=settings.LIFE_JOB_HEARTBEAT_INTERVAL):
+        return
+    job.heartbeat = current_time
+    Job.objects.filter(id=job.id).update(heartbeat=current_time)
+
+
+def reschedule_failed_job(job):
+    """
+    Puts a job that did not complete back to PENDING with an exponential backoff,
+    or marks it as FAILED once it ran out of attempts
+    """
+    job.attempts += 1
+    if job.attempts >= settings.LIFE_JOB_MAX_ATTEMPTS:
+        job.status = JobStatus.FAILED.value
+    else:
+        job.status = JobStatus.PENDING.value
+        job.next_runtime = localtime(now()) + timedelta(minutes=job.periodicity * 2 ** job.attempts)
+    job.save(update_fields=["attempts", "status", "next_runtime", "modified_date"])
+
+
+def write_batch(job, batch, duplicates, stats, checkpoint_row=None):
+    """
+    Writes a batch of validated rows, (data, state, district, row number), with a single lookup query and bulk
+    inserts / updates.
+    Rows whose data and duplicate flag did not change are only stamped with the generation and row number of the run.
+    The existing rows are locked until the batch is written: the shards of a sharded run may hold the same data_id,
+    the row that comes last in the source has to win whichever shard writes last.
+    checkpoint_row, the number of the last row of the batch, is recorded on the job in the same transaction.
+    """
+    data_ids = [data["id"] for data, _, _, _ in batch]
+    changed_objs = {}
+    unchanged_objs = {}
+    # Categories to export again, including the previous category of rows moved to another one
+    categories = set()
+    with transaction.atomic():
+        # Newest first so that the oldest object wins, like .first() did
+        existing_objs = {
+            obj.data_id: obj
+            for obj in LifeData.objects.select_for_update()
+            .filter(created_job=job, data_id__in=data_ids)
+            .order_by("-id")
+        }
+        for data, state, district, row_number in batch:
+            existing_obj = existing_objs.get(data["id"])
+            if existing_obj and existing_obj.generation == job.generation and existing_obj.source_row > row_number:
+                # Already written by a later row of the source, from a shard that completed first
+                continue
+            stored = (existing_obj.data_hash, existing_obj.is_duplicate) if existing_obj else None
+            previous_category = existing_obj.category if existing_obj else None
+            obj = get_validated_object(data, job, state, district, duplicates, existing_obj)
+            obj.source_row = row_number
+            obj.deleted = False
+            obj.generation = job.generation
+            existing_objs[obj.data_id] = obj
+            if obj.pk and obj.data_id not in changed_objs and stored == (obj.data_hash, obj.is_duplicate):
+                unchanged_objs[obj.pk] = obj
+            else:
+                changed_objs[obj.data_id] = obj
+                unchanged_objs.pop(obj.pk, None)
+                categories.update(category for category in (obj.category, previous_category) if category)
+        new_objs = [obj for obj in changed_objs.values() if obj.pk is None]
+        updated_objs = [obj for obj in changed_objs.values() if obj.pk is not None]
+        modified_date = localtime(now())
+        for obj in updated_objs:
+            # bulk_update does not apply auto_now
+            obj.modified_date = modified_date
+        LifeData.objects.bulk_create(new_objs)
+        LifeData.objects.bulk_update(updated_objs, life_data_update_fields)
+        LifeData.objects.bulk_update(unchanged_objs.values(), ["generation", "source_row"])
+        if checkpoint_row:
+            job.checkpoint_row = checkpoint_row
+            Job.objects.filter(id=job.id).update(checkpoint_row=checkpoint_row)
+    if changed_objs:
+        mark_categories_changed(categories)
+    stats["inserted"] += len(new_objs)
+    stats["updated"] += len(updated_objs)
+    stats["unchanged"] += len(unchanged_objs)
+
+
+def remove_stale_rows(job):
+    """
+    Removes the rows of a job that were not seen by its last run, returns their number
+    """
+    stale = LifeData.objects.filter(created_job=job, generation__lt=job.generation)
+    categories = set(stale.values_list("category", flat=True).distinct())
+    removed, _ = stale.delete()
+    mark_categories_changed(categories)
+    return removed
+
+
+def ingest_rows(job, rows, duplicates, timer, errors, stats, start=1, resume_after=0, checkpoint=False):
+    """
+    Validates and writes rows in batches, the first row being the header. Rows are numbered from start.
+    Rows up to resume_after were written by an interrupted run and are only validated, to report their errors.
+    With checkpoint, the number of the last row written is recorded on the job in the transaction of each batch.
+    Returns False when the header could not be mapped, no row was read then.
+    """
+    resolver = get_location_resolver()
+    mapping = None
+    batch = []
+    for row_number, row in enumerate(timer.timed(rows, "parse"), start=start):
+        timer.start("validate")
+        send_heartbeat(job)
         try:
-            if start:
-                mapping = get_mapping(row)
-                start = 0
+            if mapping is None:
+                mapping = get_mapping(row, job.mapping_profile)
                 continue
-            mapped_data = get_mapped_data(mapping, row)
+            mapped_data = mapping(row)
             mapped_data["deleted"] = False
-            validated_obj = get_validated_object(mapped_data, job)
+            state, district = get_validated_data(mapped_data, resolver)
         except Exception as e:
-            # print(e)
-            errors += str(e) + f" for row {row} \n"
-            if start:
+            errors.add_exception(e, row_number)
+            if mapping is None:
                 break
             continue
-        validated_obj.deleted = False
-        validated_obj.save()
-    LifeData.objects.filter(deleted=True).delete()
-    job.last_errors = errors
-    job.next_runtime = localtime(now()) + timedelta(minutes=job.periodicity)
+        if row_number <= resume_after:
+            stats["resumed"] += 1
+            continue
+        batch.append((mapped_data, state, district, row_number))
+        if len(batch) >= settings.LIFE_INGEST_BATCH_SIZE:
+            timer.start("write")
+            write_batch(job, batch, duplicates, stats, row_number if checkpoint else None)
+            batch = []
+    timer.start("write")
+    if batch:
+        write_batch(job, batch, duplicates, stats, row_number if checkpoint else None)
+    return mapping is not None
+
+
+def ingest_source(job, source, timer):
+    """
+    Parses a downloaded source file and writes its rows, returns the errors and the counts of the run.
+    A run interrupted before it completed is resumed after its checkpoint when the source did not change.
+    """
+    errors = ErrorLog()
+    stats = Counter(inserted=0, updated=0, unchanged=0, removed=0)
+    resume_after = job.checkpoint_row if job.checkpoint_hash == source.sha256 else 0
+    if resume_after:
+        # The duplicates flipped by the rows written before the interruption were never applied,
+        # all the rows changed in the generation are resolved once the run completes
+        duplicates = DeferredDuplicates()
+    else:
+        duplicates = DuplicateIndex(job)
+        # Rows seen in this run are stamped with the new generation, the older ones are removed once it completes
+        job.generation += 1
+        job.checkpoint_row = 0
+        job.checkpoint_hash = source.sha256
+        job.save(update_fields=["generation", "checkpoint_row", "checkpoint_hash"])
+    try:
+        mapped = ingest_rows(
+            job, read_source_rows(source), duplicates, timer, errors, stats, resume_after=resume_after, checkpoint=True
+        )
+        if not mapped:
+            # Nothing was read from the file, the rows of the job are kept and the file is ingested again next run
+            if not errors:
+                errors.add(JobErrorCode.MISSING_HEADER, "File is empty ")
+            return errors, stats
+        timer.start("duplicates")
+        send_heartbeat(job)
+        duplicates.apply()
+        if resume_after:
+            sweep_duplicates(job, job.generation, partial(send_heartbeat, job))
+    except Exception as e:
+        # The file could not be processed completely, keep the rows that were not seen yet
+        errors.add(JobErrorCode.PROCESSING_FAILED, f"Could not process file {job.file_url} : {e} ")
+    else:
+        timer.start("sweep")
+        stats["removed"] = remove_stale_rows(job)
+        job.source_hash = source.sha256
+        job.mapping_hash = get_mapping_hash(job.mapping_profile)
+        job.source_etag = source.etag
+        job.source_last_modified = source.last_modified
+        job.source_content_type = source.content_type
+        job.checkpoint_row = 0
+        job.checkpoint_hash = ""
+    return errors, stats
+
+
+def parse_file(job, reprocess=False):
+    """
+    Runs a job. When reprocessing, the last processed source is read from its snapshot instead of being downloaded
+    and it is ingested even though it did not change.
+    """
+    job.status = JobStatus.WORKING.value
+    job.save()
+    timer = RunTimer()
+    with connection.execute_wrapper(timer):
+        run = run_job_stages(job, timer, reprocess)
+    if run is None:
+        # The shards of the source are being ingested, the run is completed by finalize_sharded_ingest
+        return
+    timer.stop()
+    save_job_run(job, timer, *run)
+
+
+def run_job_stages(job, timer, reprocess=False):
+    """
+    Downloads and ingests the source of a job, then reschedules it and sends the errors by email.
+    Returns the errors, the counts of the run, whether the source was unchanged and the number of bytes downloaded,
+    or None when the source was split into shards for a sharded ingest.
+    """
+    errors = ErrorLog()
+    stats = {}
+    unchanged = False
+    fetched = False
+    downloaded = 0
+    timer.start("download")
+    try:
+        heartbeat = partial(send_heartbeat, job)
+        source = load_snapshot(job, heartbeat) if reprocess else get_source(job, heartbeat)
+    except Exception as e:
+        if reprocess:
+            errors.add(JobErrorCode.DOWNLOAD_FAILED, f"Could not load the snapshot of {job.file_url} : {e} ")
+        else:
+            errors.add(JobErrorCode.DOWNLOAD_FAILED, f"Could not download file {job.file_url} : {e} ")
+    else:
+        fetched = not reprocess
+        if source is None:
+            unchanged = True
+            if snapshots_enabled() and job.snapshot_hash != job.source_hash:
+                # The body is needed to store a snapshot of the source, the next run downloads it in full
+                job.source_etag = ""
+                job.source_last_modified = ""
+        else:
+            if not reprocess:
+                downloaded = source.size
+            with source:
+                if is_ingested(job, source) and not reprocess:
+                    unchanged = True
+                    job.source_etag = source.etag
+                    job.source_last_modified = source.last_modified
+                    if job.snapshot_hash != source.sha256:
+                        # Processed before snapshots were enabled or before its snapshot could be stored
+                        snapshot_source(job, source, timer, errors)
+                elif is_sharded(job, source):
+                    if not reprocess:
+                        snapshot_source(job, source, timer, errors)
+                    dispatch_shards(job, source, timer, errors, fetched, downloaded, reprocess)
+                    return None
+                else:
+                    errors, stats = ingest_source(job, source, timer)
+                    if not reprocess:
+                        snapshot_source(job, source, timer, errors)
+    finish_job_run(job, timer, errors, stats, unchanged, fetched, reprocess)
+    return errors, stats, unchanged, downloaded
+
+
+def is_ingested(job, source):
+    """
+    Whether the source was already ingested with the current mapping profile of the job
+    """
+    return source.sha256 == job.source_hash and job.mapping_hash == get_mapping_hash(job.mapping_profile)
+
+
+def snapshot_source(job, source, timer, errors):
+    timer.start("snapshot")
+    try:
+        if save_snapshot(source, partial(send_heartbeat, job)):
+            job.snapshot_hash = source.sha256
+            Job.objects.filter(id=job.id).update(snapshot_hash=source.sha256)
+    except Exception as e:
+        errors.add(JobErrorCode.SNAPSHOT_FAILED, f"Could not store a snapshot of {job.file_url} : {e} ")
+
+
+def finish_job_run(job, timer, errors, stats, unchanged, fetched, reprocess=False):
+    """
+    Records the stats and errors of a run, reschedules the job and sends the errors by email.
+    A reprocess, which the partner did not trigger, sends no email and does not delay the next run of the job.
+    """
+    timer.start("save")
+    duration = timer.total_duration
+    rows = stats.get("inserted", 0) + stats.get("updated", 0) + stats.get("unchanged", 0)
+    job.last_run_stats = {
+        **stats,
+        "rows": rows,
+        "duration": round(duration, 3),
+        "rows_per_second": round(rows / duration, 1) if duration else None,
+        "source_unchanged": unchanged,
+    }
+    if not unchanged:
+        errors.save(job)
+        job.last_errors = errors.render()
+    if fetched:
+        adapt_periodicity(job, unchanged)
+    if not reprocess:
+        job.next_runtime = localtime(now()) + timedelta(minutes=get_periodicity(job))
     job.status = JobStatus.PENDING.value
+    job.attempts = 0
     job.save()
+    if unchanged or reprocess:
+        return
+    timer.start("email")
     if (not job.suppress_emails) and job.email_next_sendtime < localtime(now()):
         job.email_next_sendtime = localtime(now()) + timedelta(minutes=job.email_periodicity)
         job.save()
         if errors:
-            send_email(job.name, errors, job.contact_email)
+            send_email(job.name, job.last_errors, job.contact_email)
+
+
+def is_sharded(job, source):
+    """
+    Whether the source of a job is ingested in shards: CSV sources larger than LIFE_SHARD_SIZE MB of jobs
+    with sharded_ingest. Sources with an invalid header are ingested in one piece to report it once.
+    """
+    if not job.sharded_ingest or source.size <= settings.LIFE_SHARD_SIZE * 1024 * 1024:
+        return False
+    if get_source_format(source)[0] != CSV:
+        return False
+    try:
+        get_mapping(next(read_source_rows(source), []), job.mapping_profile)
+    except Exception:
+        return False
+    return True
+
+
+def dispatch_shards(job, source, timer, errors, fetched, downloaded, reprocess=False):
+    """
+    Splits the source of a job into shards ingested in parallel by ingest_shard,
+    finalize_sharded_ingest is called with their results once all of them are written
+    """
+    job.generation += 1
+    job.checkpoint_row = 0
+    job.checkpoint_hash = ""
+    job.save(update_fields=["generation", "checkpoint_row", "checkpoint_hash"])
+    timer.start("split")
+    _, compressed = get_source_format(source)
+    first_rows = store_shards(job, iter_gunzipped_chunks(source) if compressed else source.iter_chunks())
+    timer.start("dispatch")
+    context = {
+        "generation": job.generation,
+        "sha256": source.sha256,
+        "mapping_hash": get_mapping_hash(job.mapping_profile),
+        "etag": source.etag,
+        "last_modified": source.last_modified,
+        "content_type": source.content_type,
+        "started_at": timer.started_at,
+        "stages": timer.get_stages(),
+        "errors": errors.dump(),
+        "fetched": fetched,
+        "reprocess": reprocess,
+        "downloaded": downloaded,
+        "shards": len(first_rows),
+    }
+    if not first_rows:
+        finalize_sharded_ingest.delay([], job.id, context)
+        return
+    shards = [ingest_shard.s(job.id, job.generation, index, first_row) for index, first_row in enumerate(first_rows)]
+    # The shards keep the heartbeat of the job going once they start
+    send_heartbeat(job)
+    chord(shards)(finalize_sharded_ingest.s(job.id, context))
+
+
+@shared_task
+def ingest_shard(job_id, generation, index, first_row):
+    """
+    Writes the rows of a shard of a sharded job run, returns its errors, counts and stages
+    """
+    job = Job.objects.get(id=job_id)
+    if job.generation != generation:
+        raise Exception(f"Run {generation} of job {job_id} has been superseded ")
+    send_heartbeat(job)
+    shard = get_shard(job_id, generation, index)
+    timer = RunTimer()
+    errors = ErrorLog()
+    stats = Counter(inserted=0, updated=0, unchanged=0)
+    with connection.execute_wrapper(timer):
+        # The shard starts with the header, numbered as the row before the first row of the shard
+        rows = read_csv_rows(lambda: [shard])
+        ingest_rows(job, rows, DeferredDuplicates(), timer, errors, stats, start=first_row - 1)
+    timer.stop()
+    return {"errors": errors.dump(), "stats": dict(stats), "stages": timer.get_stages()}
+
 
+@shared_task
+def finalize_sharded_ingest(results, job_id, context):
+    """
+    Completes a sharded job run once all of its shards are written.
+    When a shard fails, the job is rescheduled by reap_stuck_jobs and the rows not seen yet are kept.
+    """
+    # Every shard has been written, none of them is read again
+    delete_shards(job_id, context["generation"], context["shards"])
+    job = Job.objects.get(id=job_id)
+    if job.generation != context["generation"]:
+        return
+    try:
+        finalize_shards(job, results, context)
+    except Exception:
+        reschedule_failed_job(job)
+        raise
 
-def check_data_change(row_data, existing_data):
-    fields = ["last_verified_on", "verified_by", "verification_status"]
-    for field in fields:
-        if existing_data.get(field, "") != row_data.get(field, ""):
-            return True
-    return False
 
+def finalize_shards(job, results, context):
+    """
+    Merges the results of the shards, removes the rows the source no longer has and resolves the duplicates
+    of the changed rows, which could not be resolved while the shards were written concurrently
+    """
+    timer = RunTimer(context["started_at"])
+    timer.add_stages(context["stages"])
+    errors = ErrorLog()
+    errors.load(context["errors"])
+    stats = Counter(inserted=0, updated=0, unchanged=0, removed=0)
+    for result in results:
+        timer.add_stages(result["stages"])
+        errors.load(result["errors"])
+        stats.update(result["stats"])
+    with connection.execute_wrapper(timer):
+        timer.start("sweep")
+        send_heartbeat(job)
+        # A row repeated in two shards is inserted by both, the last one in the source is kept
+        repeated = (
+            LifeData.objects.filter(created_job=job, generation=job.generation)
+            .values("data_id")
+            .annotate(count=Count("id"))
+            .filter(count__gt=1)
+        )
+        for row in repeated:
+            send_heartbeat(job)
+            rows = LifeData.objects.filter(created_job=job, data_id=row["data_id"])
+            last_id = rows.order_by("-generation", "-source_row", "-id").values_list("id", flat=True).first()
+            extra = rows.exclude(id=last_id)
+            categories = set(extra.values_list("category", flat=True).distinct())
+            extra.delete()
+            mark_categories_changed(categories)
+        stats["removed"] = remove_stale_rows(job)
+        timer.start("duplicates")
+        sweep_duplicates(job, job.generation, partial(send_heartbeat, job))
+        job.source_hash = context["sha256"]
+        job.mapping_hash = context["mapping_hash"]
+        job.source_etag = context["etag"]
+        job.source_last_modified = context["last_modified"]
+        job.source_content_type = context["content_type"]
+        finish_job_run(job, timer, errors, stats, False, context["fetched"], context["reprocess"])
+    timer.stop()
+    save_job_run(job, timer, errors, stats, False, context["downloaded"])
+
+
+def get_periodicity(job):
+    if job.adaptive_periodicity and job.current_periodicity:
+        return job.current_periodicity
+    return job.periodicity
+
+
+def adapt_periodicity(job, unchanged):
+    """
+    Lengthens the interval between runs of an adaptive job whose source did not change in the last
+    LIFE_ADAPTIVE_UNCHANGED_RUNS runs, and shortens it when the source changed
+    """
+    if not job.adaptive_periodicity:
+        return
+    periodicity = get_periodicity(job)
+    if unchanged:
+        job.unchanged_runs += 1
+        if job.unchanged_runs >= settings.LIFE_ADAPTIVE_UNCHANGED_RUNS:
+            periodicity *= 2
+            job.unchanged_runs = 0
+    else:
+        periodicity //= 2
+        job.unchanged_runs = 0
+    job.current_periodicity = min(
+        max(periodicity, settings.LIFE_ADAPTIVE_MIN_PERIODICITY), settings.LIFE_ADAPTIVE_MAX_PERIODICITY
+    )
+
+
+def save_job_run(job, timer, errors, stats, unchanged, downloaded):
+    """
+    Records the history of a run and removes the runs older than the last LIFE_JOB_RUN_HISTORY runs of the job
+    """
+    JobRun.objects.create(
+        job=job,
+        duration=round(timer.total_duration, 3),
+        source_unchanged=unchanged,
+        bytes_downloaded=downloaded,
+        rows=job.last_run_stats["rows"],
+        inserted=stats.get("inserted", 0),
+        updated=stats.get("updated", 0),
+        unchanged=stats.get("unchanged", 0),
+        removed=stats.get("removed", 0),
+        errors=sum(errors.counts.values()),
+        queries=sum(timer.queries.values()),
+        stages=timer.get_stages(),
+    )
+    oldest_kept = job.runs.order_by("-id").values_list("id", flat=True)[
+        settings.LIFE_JOB_RUN_HISTORY - 1 : settings.LIFE_JOB_RUN_HISTORY
+    ]
+    if oldest_kept:
+        job.runs.filter(id__lt=oldest_kept[0]).delete()
 
-def get_validated_object(data, job):
 
+def validate_source(source, deadline, profile=None):
+    """
+    Runs the rows of a source through the mapping and validation of an ingest, without writing anything.
+    profile is the mapping profile the source would be ingested with.
+    Stops at the deadline, a time.monotonic() value. Returns the errors and the counts of the rows checked.
+    """
+    resolver = get_location_resolver()
+    errors = ErrorLog()
+    mapping = None
+    checked = valid = 0
+    complete = True
+    source.file = DeadlineFile(source.file, deadline)
+    try:
+        for row_number, row in enumerate(read_source_rows(source), start=1):
+            if time.monotonic() > deadline:
+                complete = False
+                break
+            try:
+                if mapping is None:
+                    mapping = get_mapping(row, profile)
+                    continue
+                checked += 1
+                get_validated_data(mapping(row), resolver)
+            except Exception as e:
+                errors.add_exception(e, row_number)
+                if mapping is None:
+                    break
+                continue
+            valid += 1
+    except TimeBudgetExceeded:
+        complete = False
+    except Exception as e:
+        # The file itself could not be read, e.g. it is not UTF-8 or not a valid workbook
+        errors.add(JobErrorCode.PROCESSING_FAILED, f"Could not process file : {e} ")
+    if mapping is None and complete and not errors:
+        errors.add(JobErrorCode.MISSING_HEADER, "File is empty ")
+    return errors, {"rows": checked, "valid_rows": valid, "complete": complete}
+
+
+def get_data_hash(data, state, district):
+    """
+    Fingerprint of the normalised data of a row, used to skip rows that did not change since the last run
+    """
+    payload = json.dumps([data, state.id, district.id], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_validated_data(data, resolver):
+    """
+    Validates the mapped data of a row and resolves its state and district
+    """
     for field in required_headers:
         if len(data[field].strip()) == 0:
-            raise Exception(f"Field {field} is required. ")
+            raise RowError(JobErrorCode.REQUIRED, f"Field {field} is required. ", field)
     data["category"] = data["category"].lower()
     for validation in choices_validation:
         if data[validation["key"]] not in validation["choices"]:
-            raise Exception(f"Choice {data[validation['key']]} is not valid for field {validation['key']} ")
+            raise RowError(
+                JobErrorCode.INVALID_CHOICE,
+                f"Choice {data[validation['key']]} is not valid for field {validation['key']} ",
+                validation["key"],
+            )
 
-    state = State.objects.filter(name__icontains=data["state"]).first()
+    state = resolver.get_state(data["state"])
     if not state:
-        raise Exception(f"State {data['state']} is not defined")
+        raise RowError(JobErrorCode.UNKNOWN_STATE, f"State {data['state']} is not defined", "state")
     del data["state"]
-    district = District.objects.filter(name__icontains=data["district"], state=state).first()
+    district = resolver.get_district(data["district"], state)
     if not district:
-        raise Exception(f"District {data['district']} is not defined")
+        raise RowError(JobErrorCode.UNKNOWN_DISTRICT, f"District {data['district']} is not defined", "district")
     del data["district"]
+    return state, district
+
 
-    existing_obj = LifeData.objects.filter(created_job=job, data_id=data["id"]).first()
-    existing_obj_exists = existing_obj is not None
+def get_validated_object(data, job, state, district, duplicates, existing_obj=None):
+    data["phone_1"] = normalize_phone(data["phone_1"])
+    data_hash = get_data_hash(data, state, district)
+    data_has_changed = existing_obj is None or existing_obj.data_hash != data_hash
     if not existing_obj:
         existing_obj = LifeData()
+    existing_obj.data_hash = data_hash
+    if data_has_changed:
+        existing_obj.changed_generation = job.generation
 
-    duplicate_objs = LifeData.objects.filter(
-        category=data["category"], phone_1=data["phone_1"], state=state, district=district
+    duplicate_key = get_duplicate_key(data["category"], data["phone_1"], state.id, district.id)
+    existing_obj.is_duplicate = duplicates.resolve(
+        data["id"], duplicate_key, data_has_changed, existing_obj.is_duplicate
     )
-    if duplicate_objs.exists():
-        data_has_changed = False
-        if existing_obj_exists:
-            data_has_changed = check_data_change(data, existing_obj.data)
-        else:
-            data_has_changed = True
-        if data_has_changed:
-            duplicate_objs.update(is_duplicate=True)
-            existing_obj.is_duplicate = False
-    else:
-        existing_obj.is_duplicate = False
 
     phone_1 = data["phone_1"]
     del data["phone_1"]
@@ -173,64 +713,174 @@ def get_validated_object(data, job):
     return existing_obj
 
 
-def get_mapped_data(mapping, row):
-    validated_row = {}
-    for header in list(mapping.keys()):
-        if len(header.strip()) == 0:
-            continue
-        validated_row[header] = row[mapping[header]]
-    return validated_row
-
-
-def get_mapping(row):
-    mapping = {}
-    for j, i in enumerate(row):
-        mapping[i.strip()] = j
+def get_mapping(row, profile=None):
+    """
+    Compiles the mapping of the columns of a header row with the mapping profile of a job, see compile_mapping.
+    The mapping is called with a row to extract its data.
+    """
+    mapping = compile_mapping(row, rows_header, profile)
     for field in required_headers:
         if field not in mapping:
-            raise Exception(f"Field {field} not present ")
+            raise RowError(JobErrorCode.MISSING_HEADER, f"Field {field} not present ", field)
     return mapping
 
 
+# Key of the transaction level advisory lock taken by claim_jobs
+CLAIM_JOBS_LOCK = 7210
+
+
+def claim_jobs(capped=True):
+    """
+    Marks due jobs as WORKING and returns their ids, without going over LIFE_JOB_CONCURRENCY running jobs
+    unless capped is False. Capped claims hold an advisory lock from counting the running jobs to committing,
+    so that concurrent dispatchers cannot both fill the same free slots.
+    Jobs locked by a concurrent dispatcher are skipped, so a job is never claimed twice.
+    """
+    with transaction.atomic():
+        jobs = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=JobStatus.PENDING.value, next_runtime__lte=localtime(now()))
+            .order_by("next_runtime", "id")
+            .values_list("id", flat=True)
+        )
+        if capped:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", [CLAIM_JOBS_LOCK])
+            available = settings.LIFE_JOB_CONCURRENCY - Job.objects.filter(status=JobStatus.WORKING.value).count()
+            if available <= 0:
+                return []
+            jobs = jobs[:available]
+        job_ids = list(jobs)
+        Job.objects.filter(id__in=job_ids).update(status=JobStatus.WORKING.value, heartbeat=localtime(now()))
+    return job_ids
+
+
+def run_claimed_job(job, reprocess=False):
+    try:
+        parse_file(job, reprocess)
+    except Exception:
+        reschedule_failed_job(Job.objects.get(id=job.id))
+        raise
+
+
+@shared_task
+def execute_job(job_id):
+    job = Job.objects.filter(id=job_id, status=JobStatus.WORKING.value).first()
+    if job:
+        run_claimed_job(job)
+
+
+@shared_task
+def reprocess_job(job_id):
+    """
+    Ingests the snapshot of the last processed source of a job again, unless the job is running or stopped
+    """
+    claimed = Job.objects.filter(id=job_id, status__in=[JobStatus.PENDING.value, JobStatus.FAILED.value]).update(
+        status=JobStatus.WORKING.value, heartbeat=localtime(now())
+    )
+    if claimed:
+        run_claimed_job(Job.objects.get(id=job_id), reprocess=True)
+
+
 @periodic_task(run_every=crontab(minute="*/2"))
 def run_jobs():
-    jobs = Job.objects.filter(status=JobStatus.PENDING.value, next_runtime__lte=localtime(now()))
-    for job in jobs:
-        # Add Concurrency Locks if needed
-        parse_file(job)
+    """
+    Claims the due jobs and prefetches their sources concurrently, each job is dispatched as soon as its source
+    is available. Jobs are still dispatched if prefetching fails, their workers then download the sources.
+    """
+    jobs = list(Job.objects.filter(id__in=claim_jobs()))
+    dispatched = set()
+
+    def dispatch(job):
+        dispatched.add(job.id)
+        execute_job.delay(job.id)
+
+    try:
+        prefetch_sources(jobs, on_prefetched=dispatch)
+    finally:
+        for job in jobs:
+            if job.id not in dispatched:
+                execute_job.delay(job.id)
+
+
+@periodic_task(run_every=crontab(minute="*/5"))
+def reap_stuck_jobs():
+    """
+    Reschedules WORKING jobs whose worker stopped sending heartbeats, e.g. because it was killed
+    """
+    stale_time = localtime(now()) - timedelta(seconds=settings.LIFE_JOB_HEARTBEAT_TIMEOUT)
+    with transaction.atomic():
+        jobs = Job.objects.select_for_update(skip_locked=True).filter(
+            Q(heartbeat__lt=stale_time) | Q(heartbeat__isnull=True), status=JobStatus.WORKING.value
+        )
+        for job in jobs:
+            reschedule_failed_job(job)
+
+
+@periodic_task(run_every=crontab(minute=0, hour=3))
+def prune_job_snapshots():
+    """
+    Deletes the expired snapshots, the snapshots of the last sources of the jobs are kept to reprocess them
+    """
+    kept_hashes = set()
+    for source_hash, snapshot_hash in Job.objects.values_list("source_hash", "snapshot_hash"):
+        kept_hashes.update(sha256 for sha256 in (source_hash, snapshot_hash) if sha256)
+    prune_snapshots(kept_hashes)
 
 
 @periodic_task(run_every=crontab(minute="*/30"))
-def save_life_data():
+def save_life_data(force=False):
+    """
+    Exports the categories that changed since their last export, or every category with force
+    """
     categories = LifeData.objects.all().select_related("state", "district").distinct("category")
+    s3 = boto3.client(
+        "s3",
+        endpoint_url=settings.LIFE_S3_ENDPOINT,
+        aws_access_key_id=settings.LIFE_S3_ACCESS_KEY,
+        aws_secret_access_key=settings.LIFE_S3_SECRET,
+    )
     for category in categories:
-        category = category.category
-        serialized_data = LifeDataSerializer(
-            LifeData.objects.filter(category=category, is_duplicate=False), many=True
-        ).data
-        all_headers = {}
-        for index in range(len(serialized_data)):
-            data = dict(serialized_data[index])
-            data.update(data["data"])
-            del data["data"]
-            serialized_data[index] = data
-            all_headers.update(data)
-        # Create CSV File
-        csv_file = io.StringIO()
-        writer = csv.DictWriter(csv_file, fieldnames=all_headers.keys())
-        writer.writeheader()
-        writer.writerows(serialized_data)
-        csv_data = csv_file.getvalue()
-        # Write CSV and Json to S3
-        s3 = boto3.resource(
-            "s3",
-            endpoint_url=settings.LIFE_S3_ENDPOINT,
-            aws_access_key_id=settings.LIFE_S3_ACCESS_KEY,
-            aws_secret_access_key=settings.LIFE_S3_SECRET,
+        manifest, created = ExportManifest.objects.get_or_create(category=category.category)
+        if not (force or created) and manifest.version == manifest.exported_version:
+            continue
+        export_category(s3, category.category)
+        # Rows changed during the export bumped the version past the exported one
+        ExportManifest.objects.filter(id=manifest.id).update(
+            exported_version=manifest.version, exported_date=localtime(now())
         )
-        s3_json_object = s3.Object(settings.LIFE_S3_BUCKET, f"{category}.json")
-        s3_json_object.put(ACL="public-read", Body=(bytes(json.dumps(serialized_data).encode("UTF-8"))))
 
-        s3_csv_object = s3.Object(settings.LIFE_S3_BUCKET, f"{category}.csv")
-        s3_csv_object.put(ACL="public-read", Body=csv_data)
 
+def export_category(s3, category):
+    """
+    Streams the rows of a category from a server side cursor into multipart uploads of its JSON and CSV,
+    and of their gzip and brotli variants. The per state and per district shards are written in the same pass.
+    The CSV header, every field of every row, is read with a query before the rows. Both are read in one
+    REPEATABLE READ transaction, so that no row can gain a field in between.
+    """
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        if outermost:
+            # Has to be the first statement of the transaction, a savepoint keeps the isolation of its transaction
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        queryset = LifeData.objects.filter(category=category, is_duplicate=False).order_by(
+            "state_id", "district_id", "id"
+        )
+        all_headers = {}
+        if queryset.exists():
+            all_headers = dict.fromkeys(key for key, _, _ in EXPORT_FIELDS if key != "data")
+            all_headers.update(dict.fromkeys(get_data_keys(queryset)))
+        bucket = settings.LIFE_S3_BUCKET
+        with ExportArtifact(s3, bucket, f"{category}.json", "application/json; charset=utf-8") as json_upload:
+            with ExportArtifact(s3, bucket, f"{category}.csv", "text/csv; charset=utf-8") as csv_upload:
+                with ShardedExport(s3, bucket, category) as shards:
+                    writer = csv.DictWriter(codecs.getwriter("UTF-8")(csv_upload), fieldnames=all_headers.keys())
+                    writer.writeheader()
+                    json_upload.write(b"[")
+                    for index, data in enumerate(iter_export_rows(queryset, settings.LIFE_EXPORT_CHUNK_SIZE)):
+                        encoded_data = json.dumps(data).encode("UTF-8")
+                        json_upload.write(b", " + encoded_data if index else encoded_data)
+                        writer.writerow(data)
+                        shards.write(data, encoded_data)
+                    json_upload.write(b"]")
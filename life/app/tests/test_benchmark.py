@@ -0,0 +1,37 @@
+import csv
+import io
+from unittest import TestCase
+
+from life.app.utils.benchmark import compare_results, generate_csv
+
+LOCATIONS = [("Andaman and Nicobar Islands (UT)", ["Nicobar", "South Andaman"]), ("Goa", ["North Goa", "South Goa"])]
+
+
+def read(body):
+    return list(csv.reader(io.StringIO(body.decode("utf-8"))))
+
+
+class TestGenerateCsv(TestCase):
+    def test_revisions_edit_the_same_rows(self):
+        first = read(generate_csv(500, LOCATIONS, seed=1))
+        second = read(generate_csv(500, LOCATIONS, seed=1, revision=1))
+
+        self.assertEqual(len(first), 501)
+        self.assertEqual(first, read(generate_csv(500, LOCATIONS, seed=1)))
+        self.assertEqual([row[0] for row in first], [row[0] for row in second])
+        edited = sum(a != b for a, b in zip(first, second))
+        self.assertTrue(0 < edited < 150)
+        self.assertTrue(any(row[1] == "" for row in first[1:]))
+
+
+class TestCompareResults(TestCase):
+    def test_regressions_outside_tolerance(self):
+        baseline = {"1000": {"ingest": {"rows_per_second": 1000, "queries": 20, "peak_rss_mb": 100}}}
+        results = {"1000": {"ingest": {"rows_per_second": 800, "queries": 21, "peak_rss_mb": 90}}}
+
+        comparison = compare_results(baseline, results, tolerance=10)
+
+        self.assertEqual(
+            [(metric, regression) for _, _, metric, _, _, _, regression in comparison],
+            [("rows_per_second", True), ("queries", False), ("peak_rss_mb", False)],
+        )
@@ -0,0 +1,87 @@
+from django.test import TestCase as DBTestCase
+
+from life.app.models import Job, LifeData
+from life.app.utils.duplicates import DuplicateIndex, get_duplicate_key
+from life.users.models import District, State
+
+
+class TestDuplicateIndex(DBTestCase):
+    def setUp(self):
+        self.state = State.objects.create(name="Goa")
+        self.district = District.objects.create(state=self.state, name="North Goa")
+        self.job = Job.objects.create(file_url="https://example.com/sheet.csv", contact_email="a@example.com")
+        self.other_job = Job.objects.create(file_url="https://example.com/other.csv", contact_email="b@example.com")
+
+    def create_row(self, job, data_id, category, phone_1, is_duplicate=False):
+        return LifeData.objects.create(
+            created_job=job,
+            data_id=data_id,
+            category=category,
+            phone_1=phone_1,
+            state=self.state,
+            district=self.district,
+            is_duplicate=is_duplicate,
+        )
+
+    def key(self, category, phone_1):
+        return get_duplicate_key(category, phone_1, self.state.id, self.district.id)
+
+    def test_groups_span_jobs(self):
+        other = self.create_row(self.other_job, "1", "hospital", "222")
+        unrelated = self.create_row(self.other_job, "2", "hospital", "333")
+        index = DuplicateIndex(self.job)
+
+        self.assertFalse(index.resolve("1", self.key("hospital", " 222 "), True, False))
+        index.apply()
+
+        other.refresh_from_db()
+        unrelated.refresh_from_db()
+        self.assertTrue(other.is_duplicate)
+        self.assertFalse(unrelated.is_duplicate)
+
+    def test_unchanged_rows_keep_their_flag(self):
+        self.create_row(self.job, "1", "hospital", "222", is_duplicate=True)
+        self.create_row(self.job, "2", "hospital", "222")
+        index = DuplicateIndex(self.job)
+
+        self.assertTrue(index.resolve("1", self.key("hospital", "222"), False, True))
+        self.assertFalse(index.resolve("2", self.key("hospital", "222"), False, False))
+        self.assertEqual(index.duplicates, set())
+
+    def test_unchanged_row_flagged_by_an_earlier_changed_row(self):
+        self.create_row(self.job, "1", "hospital", "222")
+        self.create_row(self.job, "2", "hospital", "222")
+        index = DuplicateIndex(self.job)
+
+        self.assertFalse(index.resolve("1", self.key("hospital", "222"), True, False))
+        self.assertTrue(index.resolve("2", self.key("hospital", "222"), False, False))
+        # The flag is written with row 2, it is not updated again
+        self.assertEqual(index.duplicates, set())
+
+    def test_rows_moving_between_categories(self):
+        moved = self.create_row(self.job, "1", "hospital", "222")
+        oxygen = self.create_row(self.other_job, "1", "oxygen", "111")
+        index = DuplicateIndex(self.job)
+
+        self.assertFalse(index.resolve("1", self.key("oxygen", "111"), True, False))
+        # The row left the group of its previous category
+        self.assertFalse(index.resolve("2", self.key("hospital", "222"), True, False))
+        self.assertEqual(index.duplicates, {oxygen.pk})
+        index.apply()
+
+        moved.refresh_from_db()
+        oxygen.refresh_from_db()
+        self.assertFalse(moved.is_duplicate)
+        self.assertTrue(oxygen.is_duplicate)
+
+    def test_repeated_data_ids(self):
+        index = DuplicateIndex(self.job)
+
+        self.assertFalse(index.resolve("1", self.key("hospital", "222"), True, False))
+        # A row is not a duplicate of its own earlier occurrence
+        self.assertFalse(index.resolve("1", self.key("hospital", "222"), True, False))
+        self.assertEqual(index.duplicates, set())
+        # The last occurrence moves the row to another group
+        self.assertFalse(index.resolve("1", self.key("hospital", "333"), True, False))
+        self.assertFalse(index.resolve("2", self.key("hospital", "222"), True, False))
+        self.assertEqual(index.duplicates, set())
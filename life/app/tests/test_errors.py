@@ -0,0 +1,52 @@
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from life.app.models import Job, JobErrorCode
+from life.app.utils.errors import ErrorLog, RowError
+
+
+class TestErrorLog(TestCase):
+    def setUp(self):
+        self.job = Job.objects.create(file_url="https://example.com/sheet.csv", contact_email="a@example.com")
+
+    @override_settings(LIFE_JOB_MAX_ERRORS=2)
+    def test_errors_are_capped_and_counted(self):
+        errors = ErrorLog()
+        for row in range(2, 6):
+            errors.add_exception(RowError(JobErrorCode.REQUIRED, "Field title is required. ", "title"), row)
+        errors.add_exception(IndexError("list index out of range"), 6)
+
+        errors.save(self.job)
+
+        self.assertEqual(self.job.error_counts, {"required": 4, "invalid_row": 1})
+        self.assertEqual(
+            list(self.job.errors.order_by("id").values_list("row", "field", "code")),
+            [(2, "title", "required"), (3, "title", "required")],
+        )
+        self.assertEqual(
+            errors.render().splitlines(),
+            [
+                "4 required errors ",
+                "1 invalid_row errors ",
+                "Row 2 : Field title is required. ",
+                "Row 3 : Field title is required. ",
+                "... and 3 more errors ",
+            ],
+        )
+
+    def test_errors_endpoint(self):
+        errors = ErrorLog()
+        errors.add(JobErrorCode.UNKNOWN_STATE, "State Atlantis is not defined", 2, "state")
+        errors.add(JobErrorCode.REQUIRED, "Field phone_1 is required. ", 3, "phone_1")
+        errors.save(self.job)
+        self.job.save()
+
+        response = APIClient().get(f"/api/v1/life/jobs/{self.job.external_id}/errors/", {"code": "required"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 1)
+        self.assertEqual(response.data["counts"], {"unknown_state": 1, "required": 1})
+        self.assertEqual(
+            response.data["results"],
+            [{"row": 3, "field": "phone_1", "code": "required", "message": "Field phone_1 is required. "}],
+        )
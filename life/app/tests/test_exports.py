@@ -0,0 +1,313 @@
+import csv
+import gzip
+import io
+import json
+import threading
+from unittest import TestCase, mock
+
+import brotli
+from botocore.exceptions import ClientError
+from django.db import connection
+from django.test import TestCase as DBTestCase
+from django.test import TransactionTestCase
+
+from life.app.api.serializers.lifedata import LifeDataSerializer
+from life.app.models import ExportManifest, Job, LifeData
+from life.app.tasks.job_executor import remove_stale_rows, save_life_data
+from life.app.utils.duplicates import DuplicateIndex, sweep_duplicates
+from life.app.utils.exports import MultipartUpload, get_data_keys, iter_export_rows, mark_categories_changed
+from life.users.models import District, State
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+        self.extra_args = {}
+        self.uploads = {}
+
+    def put_object(self, Bucket, Key, Body, **extra_args):
+        self.objects[Key] = Body
+        self.extra_args[Key] = extra_args
+
+    def create_multipart_upload(self, Bucket, Key, **extra_args):
+        self.uploads[Key] = []
+        self.extra_args[Key] = extra_args
+        return {"UploadId": Key}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.uploads[UploadId].append(Body)
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        assert [part["PartNumber"] for part in MultipartUpload["Parts"]] == list(range(1, len(self.uploads[Key]) + 1))
+        self.objects[Key] = b"".join(self.uploads.pop(UploadId))
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId)
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+    def delete_objects(self, Bucket, Delete):
+        for obj in Delete["Objects"]:
+            self.objects.pop(obj["Key"], None)
+
+
+class TestMultipartUpload(TestCase):
+    def test_parts(self):
+        s3 = FakeS3()
+        with MultipartUpload(s3, "bucket", "key", part_size=4, ACL="public-read") as upload:
+            for chunk in [b"abc", b"defgh", b"i"]:
+                upload.write(chunk)
+
+        self.assertEqual(s3.objects["key"], b"abcdefghi")
+        self.assertEqual(s3.extra_args["key"], {"ACL": "public-read"})
+
+    def test_small_object(self):
+        s3 = FakeS3()
+        with MultipartUpload(s3, "bucket", "key", part_size=4) as upload:
+            upload.write(b"abc")
+
+        self.assertEqual(s3.objects["key"], b"abc")
+
+    def test_abort(self):
+        s3 = FakeS3()
+        with self.assertRaises(ValueError):
+            with MultipartUpload(s3, "bucket", "key", part_size=4) as upload:
+                upload.write(b"abcdefgh")
+                raise ValueError()
+
+        self.assertEqual((s3.objects, s3.uploads), ({}, {}))
+
+
+def legacy_export(category):
+    """
+    Export of a category as it was built in memory before it was streamed
+    """
+    serialized_data = LifeDataSerializer(
+        LifeData.objects.filter(category=category, is_duplicate=False).order_by("state_id", "district_id", "id"),
+        many=True,
+    ).data
+    all_headers = {}
+    for index in range(len(serialized_data)):
+        data = dict(serialized_data[index])
+        data.update(data["data"])
+        del data["data"]
+        serialized_data[index] = data
+        all_headers.update(data)
+    csv_file = io.StringIO()
+    writer = csv.DictWriter(csv_file, fieldnames=all_headers.keys())
+    writer.writeheader()
+    writer.writerows(serialized_data)
+    return json.dumps(serialized_data).encode("UTF-8"), csv_file.getvalue().encode("UTF-8")
+
+
+class TestSaveLifeData(DBTestCase):
+    def setUp(self):
+        state = State.objects.create(name="Goa")
+        district = District.objects.create(state=state, name="North Goa")
+        job = Job.objects.create(file_url="https://example.com/sheet.csv", name="Sheet", contact_email="a@example.com")
+        rows = [
+            ("oxygen", {"title": "Cylinders", "address": 'Panaji, "Main" Road'}, False),
+            ("oxygen", {"title": "Concentrators", "pincode": "403001", "comment": "नया"}, False),
+            ("oxygen", {"title": "Hidden", "extra": "x"}, True),
+            ("hospital", {"title": "Beds", "hospital_available_icu_beds": "4"}, False),
+            ("food", {"title": "Meals"}, True),
+        ]
+        for index, (category, data, is_duplicate) in enumerate(rows):
+            LifeData.objects.create(
+                created_job=job,
+                data_id=str(index),
+                category=category,
+                data=data,
+                phone_1=str(index),
+                state=state,
+                district=district,
+                is_duplicate=is_duplicate,
+            )
+
+    def test_export_rows_match_serializer(self):
+        queryset = LifeData.objects.order_by("id")
+        expected = []
+        for item in LifeDataSerializer(queryset, many=True).data:
+            row = dict(item)
+            row.update(row["data"])
+            del row["data"]
+            expected.append(list(row.items()))
+
+        rows = [list(row.items()) for row in iter_export_rows(queryset, 2)]
+
+        self.assertEqual(rows, expected)
+        self.assertEqual([type(value) for _, value in rows[0]], [type(value) for _, value in expected[0]])
+
+    @mock.patch("life.app.tasks.job_executor.boto3")
+    def test_export_matches_in_memory_export(self, boto3):
+        s3 = boto3.client.return_value = FakeS3()
+
+        with self.settings(LIFE_EXPORT_PART_SIZE=0.0001, LIFE_EXPORT_CHUNK_SIZE=1):
+            save_life_data()
+
+        for category in ["oxygen", "hospital", "food"]:
+            json_data, csv_data = legacy_export(category)
+            self.assertEqual(s3.objects[f"{category}.json"], json_data)
+            self.assertEqual(s3.objects[f"{category}.csv"], csv_data)
+        self.assertNotIn(b"extra", s3.objects["oxygen.csv"])
+
+    @mock.patch("life.app.tasks.job_executor.boto3")
+    def test_compressed_variants(self, boto3):
+        s3 = boto3.client.return_value = FakeS3()
+
+        save_life_data()
+
+        for extension, content_type in [
+            ("json", "application/json; charset=utf-8"),
+            ("csv", "text/csv; charset=utf-8"),
+        ]:
+            key = f"oxygen.{extension}"
+            self.assertEqual(gzip.decompress(s3.objects[f"{key}.gz"]), s3.objects[key])
+            self.assertEqual(brotli.decompress(s3.objects[f"{key}.br"]), s3.objects[key])
+            self.assertEqual(s3.extra_args[key]["ContentType"], content_type)
+            self.assertEqual(s3.extra_args[f"{key}.gz"]["ContentEncoding"], "gzip")
+            self.assertEqual(s3.extra_args[f"{key}.br"]["ContentEncoding"], "br")
+            self.assertEqual(s3.extra_args[f"{key}.br"]["CacheControl"], "public, max-age=300")
+
+    @mock.patch("life.app.tasks.job_executor.boto3")
+    def test_only_changed_categories_are_exported(self, boto3):
+        s3 = boto3.client.return_value = FakeS3()
+        save_life_data()
+        keys = set(s3.objects)
+        s3.objects = {}
+
+        save_life_data()
+        self.assertEqual(s3.objects, {})
+
+        mark_categories_changed(["hospital"])
+        save_life_data()
+        self.assertEqual({key.split(".")[0].split("/")[0] for key in s3.objects}, {"hospital"})
+
+        s3.objects = {}
+        save_life_data(force=True)
+        self.assertEqual(set(s3.objects), keys)
+
+    def test_deleted_jobs_change_their_categories(self):
+        mark_categories_changed(["oxygen"])
+
+        Job.objects.all().delete()
+
+        versions = dict(ExportManifest.objects.values_list("category", "version"))
+        self.assertEqual(versions, {"oxygen": 2, "hospital": 1, "food": 1})
+
+    def test_duplicate_flags_and_removals_change_their_categories(self):
+        job = Job.objects.first()
+        other_job = Job.objects.create(file_url="https://example.com/other.csv", contact_email="a@example.com")
+        beds = LifeData.objects.get(data_id="3")
+        LifeData.objects.create(
+            created_job=other_job,
+            data_id="3",
+            category="hospital",
+            phone_1="3",
+            state=beds.state,
+            district=beds.district,
+        )
+        LifeData.objects.filter(id=beds.id).update(changed_generation=1)
+        index = DuplicateIndex(job)
+        index.duplicates = {"1", "2"}
+
+        index.apply()
+        self.assertEqual(dict(ExportManifest.objects.values_list("category", "version")), {"oxygen": 1})
+        sweep_duplicates(job, 1)
+        self.assertEqual(other_job.lifedata_set.get().is_duplicate, True)
+        self.assertEqual(dict(ExportManifest.objects.values_list("category", "version")), {"oxygen": 1, "hospital": 1})
+        job.generation = 1
+        remove_stale_rows(job)
+
+        versions = dict(ExportManifest.objects.values_list("category", "version"))
+        self.assertEqual(versions, {"oxygen": 2, "hospital": 2, "food": 1})
+
+    @mock.patch("life.app.tasks.job_executor.boto3")
+    def test_sharded_exports(self, boto3):
+        s3 = boto3.client.return_value = FakeS3()
+        job = Job.objects.first()
+        goa = State.objects.get(name="Goa")
+        south_goa = District.objects.create(state=goa, name="South Goa")
+        kerala = State.objects.get(name="Kerala")
+        kollam = District.objects.filter(state=kerala).first()
+        for index, (state, district) in enumerate([(kerala, kollam), (goa, south_goa), (goa, south_goa)]):
+            LifeData.objects.create(
+                created_job=job,
+                data_id=f"shard-{index}",
+                category="oxygen",
+                data={"title": f"Shard {index}"},
+                phone_1=f"shard-{index}",
+                state=state,
+                district=district,
+            )
+
+        save_life_data()
+
+        rows = json.loads(s3.objects["oxygen.json"])
+        index = json.loads(s3.objects["oxygen/index.json"])
+        self.assertEqual(sum(state["rows"] for state in index["states"]), len(rows))
+        for state in index["states"]:
+            self.assertEqual(
+                json.loads(s3.objects[state["key"]]), [row for row in rows if row["state_id"] == state["state_id"]]
+            )
+            for district in state["districts"]:
+                shard = s3.objects[f"oxygen/{state['state_id']}/{district['district_id']}.json"]
+                self.assertEqual(
+                    json.loads(shard), [row for row in rows if row["district_id"] == district["district_id"]]
+                )
+                self.assertEqual(district["rows"], len(json.loads(shard)))
+        goa_index = next(state for state in index["states"] if state["state"] == "Goa")
+        self.assertEqual([district["rows"] for district in goa_index["districts"]], [2, 2])
+        self.assertIn(f"oxygen/{goa.id}/{south_goa.id}.json.br", s3.objects)
+
+        LifeData.objects.filter(state=kerala).delete()
+        LifeData.objects.filter(district=south_goa).update(district=District.objects.get(name="North Goa"))
+        save_life_data(force=True)
+
+        for key in [
+            f"oxygen/{kerala.id}.json",
+            f"oxygen/{kerala.id}/{kollam.id}.json",
+            f"oxygen/{goa.id}/{south_goa.id}.json",
+        ]:
+            for extension in ["", ".gz", ".br"]:
+                self.assertNotIn(f"{key}{extension}", s3.objects)
+        self.assertEqual(len(json.loads(s3.objects[f"oxygen/{goa.id}.json"])), 4)
+
+
+class TestExportSnapshot(TransactionTestCase):
+    # States and districts are created by a migration
+    serialized_rollback = True
+
+    @mock.patch("life.app.tasks.job_executor.boto3")
+    def test_rows_gaining_fields_during_an_export(self, boto3):
+        s3 = boto3.client.return_value = FakeS3()
+        state = State.objects.create(name="Goa")
+        district = District.objects.create(state=state, name="North Goa")
+        job = Job.objects.create(file_url="https://example.com/sheet.csv", contact_email="a@example.com")
+        row = LifeData.objects.create(
+            created_job=job, data_id="1", category="oxygen", data={"title": "Cylinders"}, state=state, district=district
+        )
+
+        def add_field():
+            LifeData.objects.filter(id=row.id).update(data={"title": "Cylinders", "added": "x"})
+            connection.close()
+
+        def get_data_keys_then_add_field(queryset):
+            keys = get_data_keys(queryset)
+            # Committed by another connection between the query of the header and the one of the rows
+            thread = threading.Thread(target=add_field)
+            thread.start()
+            thread.join()
+            return keys
+
+        with mock.patch("life.app.tasks.job_executor.get_data_keys", get_data_keys_then_add_field):
+            save_life_data()
+
+        self.assertNotIn(b"added", s3.objects["oxygen.csv"])
+        self.assertNotIn(b"added", s3.objects["oxygen.json"])
+        save_life_data(force=True)
+        self.assertIn(b"added", s3.objects["oxygen.csv"])
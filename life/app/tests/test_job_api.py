@@ -0,0 +1,74 @@
+import io
+import itertools
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from life.app.models import LifeData
+from life.app.tasks.job_executor import validate_source
+from life.app.utils.sources import DOWNLOAD_CHUNK_SIZE, DownloadedSource
+from life.users.models import District, State
+
+
+class TestValidateJobSource(TestCase):
+    def setUp(self):
+        state = State.objects.create(name="Goa")
+        District.objects.create(state=state, name="North Goa")
+
+    def test_uploaded_file(self):
+        body = (
+            b"id,title,category,phone_1,district,state\n"
+            b"1,Cylinders,oxygen,111,North Goa,Goa\n"
+            b"2,Beds,beds,222,North Goa,Goa\n"
+            b"3,Beds,hospital,333,Nowhere,Goa\n"
+        )
+        upload = SimpleUploadedFile("sheet.csv", body, content_type="text/csv")
+
+        response = APIClient().post("/api/v1/life/jobs/validate/", {"file": upload}, format="multipart")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {key: response.data[key] for key in ("rows", "valid_rows", "complete", "counts")},
+            {"rows": 3, "valid_rows": 1, "complete": True, "counts": {"invalid_choice": 1, "unknown_district": 1}},
+        )
+        self.assertEqual([error["row"] for error in response.data["errors"]], [3, 4])
+        self.assertFalse(LifeData.objects.exists())
+
+    def test_unreadable_files(self):
+        for name, body in [
+            ("sheet.csv", b"id,title,category,phone_1,district,state\n1,\xff\xfe,oxygen,111,North Goa,Goa\n"),
+            ("sheet.ndjson", b'{"id": "1"}\n{"id": \n'),
+            ("sheet.xlsx", b"PK\x03\x04 not a workbook"),
+        ]:
+            upload = SimpleUploadedFile(name, body)
+
+            response = APIClient().post("/api/v1/life/jobs/validate/", {"file": upload}, format="multipart")
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data["counts"], {"processing_failed": 1})
+
+    @mock.patch("life.app.utils.sources.time.monotonic", side_effect=itertools.count())
+    def test_deadline_bounds_reading_the_file(self, monotonic):
+        body = b'{"id": "1", "title": "Cylinders"}\n' * 20000
+        file = io.BytesIO(body)
+        source = DownloadedSource(file, "", size=len(body), url="sheet.ndjson")
+
+        with mock.patch.object(file, "read", wraps=file.read) as read:
+            # The keys of every line of NDJSON are read before the first row
+            errors, counts = validate_source(source, 2)
+
+        self.assertEqual(counts, {"rows": 0, "valid_rows": 0, "complete": False})
+        self.assertFalse(errors)
+        self.assertLess(read.call_count * DOWNLOAD_CHUNK_SIZE, len(body))
+
+    @mock.patch("life.app.utils.sources.requests.get")
+    def test_private_urls_are_not_fetched(self, get):
+        response = APIClient().post(
+            "/api/v1/life/jobs/validate/", {"file_url": "http://127.0.0.1:8000/admin/"}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["counts"], {"download_failed": 1})
+        get.assert_not_called()
@@ -0,0 +1,532 @@
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.admin import site
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase as DBTestCase
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+
+from life.app.admin import RUN_STAGES, JobAdmin
+from life.app.models import ExportManifest, Job, JobStatus, LifeData
+from life.app.tasks.job_executor import (
+    adapt_periodicity,
+    claim_jobs,
+    get_validated_object,
+    parse_file,
+    prune_job_snapshots,
+    reap_stuck_jobs,
+    reprocess_job,
+    write_batch,
+)
+from life.app.tests.test_sources import FakeResponse
+from life.app.utils.duplicates import DeferredDuplicates
+from life.app.utils.sharding import get_shard_cache_key
+from life.users.models import District, State
+
+
+class TestClaimJobs(DBTestCase):
+    def create_job(self, **kwargs):
+        job = Job.objects.create(file_url="https://example.com/sheet.csv", contact_email="a@example.com", **kwargs)
+        Job.objects.filter(id=job.id).update(next_runtime=now() - timedelta(minutes=1))
+        return job
+
+    @override_settings(LIFE_JOB_CONCURRENCY=2)
+    def test_claims_due_jobs_up_to_concurrency(self):
+        jobs = [self.create_job() for _ in range(3)]
+        self.create_job(status=JobStatus.STOPPED.value)
+
+        with CaptureQueriesContext(connection) as queries:
+            claimed = claim_jobs()
+
+        self.assertEqual(claimed, [jobs[0].id, jobs[1].id])
+        self.assertEqual(Job.objects.filter(status=JobStatus.WORKING.value).count(), 2)
+        # The running jobs are counted under a lock held until the claim is committed
+        self.assertTrue(any("pg_advisory_xact_lock" in query["sql"] for query in queries))
+        # Nothing else can be claimed until a running job finishes
+        self.assertEqual(claim_jobs(), [])
+
+    @override_settings(LIFE_JOB_CONCURRENCY=1)
+    def test_uncapped_claims(self):
+        jobs = [self.create_job() for _ in range(3)]
+
+        self.assertEqual(claim_jobs(capped=False), [job.id for job in jobs])
+
+
+class TestReapStuckJobs(DBTestCase):
+    def create_job(self, heartbeat, attempts=0):
+        job = Job.objects.create(
+            file_url="https://example.com/sheet.csv",
+            contact_email="a@example.com",
+            status=JobStatus.WORKING.value,
+            attempts=attempts,
+        )
+        Job.objects.filter(id=job.id).update(heartbeat=heartbeat)
+        return job
+
+    @override_settings(LIFE_JOB_HEARTBEAT_TIMEOUT=600, LIFE_JOB_MAX_ATTEMPTS=3)
+    def test_stale_jobs_are_retried_then_failed(self):
+        alive = self.create_job(now())
+        stale = self.create_job(now() - timedelta(minutes=20))
+        exhausted = self.create_job(now() - timedelta(minutes=20), attempts=2)
+
+        reap_stuck_jobs()
+
+        alive.refresh_from_db()
+        stale.refresh_from_db()
+        exhausted.refresh_from_db()
+        self.assertEqual(alive.status, JobStatus.WORKING.value)
+        self.assertEqual(stale.status, JobStatus.PENDING.value)
+        self.assertEqual(stale.attempts, 1)
+        self.assertGreater(stale.next_runtime, now() + timedelta(minutes=stale.periodicity))
+        self.assertEqual(exhausted.status, JobStatus.FAILED.value)
+
+
+class TestPruneJobSnapshots(DBTestCase):
+    @override_settings(LIFE_SNAPSHOT_STORAGE="local", LIFE_SNAPSHOT_RETENTION=30)
+    def test_expired_snapshots_are_deleted(self):
+        Job.objects.create(
+            file_url="https://example.com/sheet.csv", contact_email="a@example.com", source_hash="a" * 64
+        )
+        with tempfile.TemporaryDirectory() as snapshot_dir:
+            old = time.time() - 31 * 24 * 3600
+            for name, modified in [("a", old), ("b", old), ("c", time.time())]:
+                path = os.path.join(snapshot_dir, f"{name * 64}.gz")
+                open(path, "wb").close()
+                os.utime(path, (modified, modified))
+
+            with override_settings(LIFE_SNAPSHOT_DIR=snapshot_dir):
+                prune_job_snapshots()
+
+            self.assertEqual(sorted(os.listdir(snapshot_dir)), [f"{'a' * 64}.gz", f"{'c' * 64}.gz"])
+
+
+class TestAdaptPeriodicity(SimpleTestCase):
+    @override_settings(
+        LIFE_ADAPTIVE_UNCHANGED_RUNS=2, LIFE_ADAPTIVE_MIN_PERIODICITY=5, LIFE_ADAPTIVE_MAX_PERIODICITY=30
+    )
+    def test_interval_follows_changes_within_bounds(self):
+        job = Job(periodicity=10, adaptive_periodicity=True)
+        periodicities = []
+        for unchanged in [True, True, True, True, True, True, False, False, False]:
+            adapt_periodicity(job, unchanged)
+            periodicities.append(job.current_periodicity)
+
+        self.assertEqual(periodicities, [10, 20, 20, 30, 30, 30, 15, 7, 5])
+
+
+class TestParseFile(DBTestCase):
+    def setUp(self):
+        self.state = State.objects.create(name="Goa")
+        District.objects.create(state=self.state, name="North Goa")
+        self.job = Job.objects.create(
+            file_url="https://example.com/sheet.csv", contact_email="a@example.com", suppress_emails=True
+        )
+
+    @mock.patch("life.app.utils.sources.requests.get")
+    def test_runs_are_recorded(self, get):
+        body = (
+            b"id,title,category,phone_1,district,state\n"
+            b"1,Cylinders,oxygen,111,North Goa,Goa\n"
+            b"2,Beds,hospital,222,North Goa,Goa\n"
+            b"3,Beds,hospital,333,Nowhere,Goa\n"
+        )
+        get.return_value = FakeResponse(200, body)
+        parse_file(self.job)
+        get.return_value = FakeResponse(200, body.replace(b"Cylinders", b"Concentrators"))
+        parse_file(self.job)
+
+        first, second = self.job.runs.order_by("id")
+        self.assertEqual((first.rows, first.inserted, first.errors, first.bytes_downloaded), (2, 2, 1, len(body)))
+        self.assertEqual((second.updated, second.unchanged), (1, 1))
+        self.assertGreater(first.stages["write"]["queries"], 0)
+        self.assertIn("download", first.stages)
+        self.assertLessEqual(set(first.stages), set(RUN_STAGES))
+        self.assertIn("<svg", JobAdmin(Job, site).run_history(self.job))
+        # Only the categories with changed rows are exported again
+        versions = dict(ExportManifest.objects.values_list("category", "version"))
+        self.assertEqual(versions, {"oxygen": 2, "hospital": 1})
+
+    @mock.patch("life.app.utils.sources.requests.get")
+    def test_categories_are_marked_after_the_rows_commit(self, get):
+        body = b"id,title,category,phone_1,district,state\n1,Cylinders,oxygen,111,North Goa,Goa\n"
+        get.return_value = FakeResponse(200, body)
+
+        with CaptureQueriesContext(connection) as queries:
+            parse_file(self.job)
+
+        statements = [query["sql"] for query in queries]
+        inserted = next(index for index, sql in enumerate(statements) if sql.startswith('INSERT INTO "app_lifedata"'))
+        marked = next(index for index, sql in enumerate(statements) if '"app_exportmanifest"' in sql)
+        # The manifest is locked after the rows and not while the batch is open, concurrent jobs cannot deadlock
+        self.assertTrue(any(sql.startswith("RELEASE SAVEPOINT") for sql in statements[inserted:marked]))
+
+    @override_settings(LIFE_INGEST_BATCH_SIZE=2)
+    @mock.patch("life.app.utils.sources.requests.get")
+    def test_rows_are_written_in_batches(self, get):
+        body = b"id,title,category,phone_1,district,state\n" + b"".join(
+            f"{index},Beds,hospital,{index}00,North Goa,Goa\n".encode() for index in range(5)
+        )
+        get.return_value = FakeResponse(200, body)
+
+        with mock.patch("life.app.tasks.job_executor.write_batch", wraps=write_batch) as wrapped:
+            parse_file(self.job)
+
+        self.assertEqual([len(call[0][1]) for call in wrapped.call_args_list], [2, 2, 1])
+        self.assertEqual(self.job.lifedata_set.count(), 5)
+        self.assertEqual(self.job.last_run_stats["inserted"], 5)
+        self.assertGreater(self.job.last_run_stats["rows_per_second"], 0)
+
+    @mock.patch("life.app.utils.sources.requests.get")
+    def test_unchanged_rows_are_not_rewritten(self, get):
+        body = (
+            b"id,title,category,phone_1,district,state\n"
+            b"1,Cylinders,oxygen,111,North Goa,Goa\n"
+            b"2,Beds,hospital,222,North Goa,Goa\n"
+            b"3,Beds,hospital,333,North Goa,Goa\n"
+        )
+        get.return_value = FakeResponse(200, body)
+        parse_file(self.job)
+        written = dict(self.job.lifedata_set.values_list("data_id", "modified_date"))
+
+        get.return_value = FakeResponse(
+            200, body.replace(b"Cylinders", b"Concentrators").replace(b"3,Beds,hospital,333,North Goa,Goa\n", b"")
+        )
+        parse_file(self.job)
+
+        rows = {row.data_id: row for row in self.job.lifedata_set.all()}
+        self.assertEqual(rows["2"].modified_date, written["2"])
+        self.assertGreater(rows["1"].modified_date, written["1"])
+        self.assertEqual(rows["1"].data["title"], "Concentrators")
+        self.assertEqual(
+            {key: self.job.last_run_stats[key] for key in ["inserted", "updated", "unchanged", "removed"]},
+            {"inserted": 0, "updated": 1, "unchanged": 1, "removed": 1},
+        )
+
+    @mock.patch("life.app.utils.sources.requests.get")
+    def test_stale_rows_of_other_jobs_are_kept(self, get):
+        other_job = Job.objects.create(file_url="https://example.com/other.csv", contact_email="b@example.com")
+        other_row = LifeData.objects.create(
+            created_job=other_job,
+            data_id="1",
+            category="oxygen",
+            phone_1="111",
+            state=self.state,
+            district=self.state.district_set.get(),
+            # Left behind by a run of the other job in progress
+            deleted=True,
+        )
+        body = (
+            b"id,title,category,phone_1,district,state\n"
+            b"1,Cylinders,oxygen,111,North Goa,Goa\n"
+            b"2,Beds,hospital,222,North Goa,Goa\n"
+        )
+        get.return_value = FakeResponse(200, body)
+        parse_file(self.job)
+        get.return_value = FakeResponse(200, body.replace(b"2,Beds,hospital,222,North Goa,Goa\n", b""))
+        parse_file(self.job)
+
+        self.assertEqual(list(self.job.lifedata_set.values_list("data_id", flat=True)), ["1"])
+        self.assertTrue(LifeData.objects.filter(id=other_row.id).exists())
+
+    @mock.patch("life.app.utils.sources.requests.get")
+    def test_mapping_profile_changes(self, get):
+        body = b"id,title,category,phone_1,district,state\n1,oxygen cylinders,oxygen,111,North Goa,Goa\n"
+        get.return_value = FakeResponse(200, body, {"ETag": '"v1"'})
+        parse_file(self.job)
+
+        self.job.mapping_profile = {"normalizers": {"title": ["title"]}}
+        self.job.save()
+        parse_file(self.job)
+
+        # The validators of the last download are not sent, the server would answer that nothing changed
+        self.assertEqual(get.call_args[1]["headers"], {})
+        self.assertEqual(self.job.lifedata_set.get().data["title"], "Oxygen Cylinders")
+        self.assertEqual(self.job.runs.order_by("id").last().updated, 1)
+        parse_file(self.job)
+        self.assertEqual(get.call_args[1]["headers"], {"If-None-Match": '"v1"'})
+        self.assertTrue(self.job.last_run_stats["source_unchanged"])
+
+    @mock.patch("life.app.utils.sources.requests.get")
+    def test_unmapped_header_keeps_rows(self, get):
+        body = b"id,title,category,phone_1,district,state\n1,Cylinders,oxygen,111,North Goa,Goa\n"
+        get.return_value = FakeResponse(200, body)
+        parse_file(self.job)
+        source_hash = self.job.source_hash
+
+        get.return_value = FakeResponse(200, body.replace(b"phone_1", b"contact person"))
+        parse_file(self.job)
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.lifedata_set.count(), 1)
+        self.assertEqual(self.job.source_hash, source_hash)
+        self.assertEqual(self.job.error_counts, {"missing_header": 1})
+
+    @mock.patch("life.app.utils.sources.requests.get")
+    def test_reprocess_from_snapshot(self, get):
+        body = b"id,title,category,phone_1,district,state\n1,Beds,hospital,222,North Goa,Goa\n2,Beds,hospital,333,South Goa,Goa\n"
+        get.return_value = FakeResponse(200, body)
+        with tempfile.TemporaryDirectory() as snapshot_dir:
+            with override_settings(LIFE_SNAPSHOT_STORAGE="local", LIFE_SNAPSHOT_DIR=snapshot_dir):
+                parse_file(self.job)
+                District.objects.create(state=self.state, name="South Goa")
+
+                reprocess_job(self.job.id)
+
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(self.job.lifedata_set.count(), 2)
+        self.assertEqual(self.job.runs.order_by("id").last().inserted, 1)
+
+    @mock.patch("life.app.utils.sources.requests.get")
+    def test_snapshot_of_unchanged_source(self, get):
+        body = b"id,title,category,phone_1,district,state\n1,Beds,hospital,222,North Goa,Goa\n"
+        get.return_value = FakeResponse(200, body, {"ETag": '"v1"'})
+        parse_file(self.job)
+        with tempfile.TemporaryDirectory() as snapshot_dir:
+            with override_settings(LIFE_SNAPSHOT_STORAGE="local", LIFE_SNAPSHOT_DIR=snapshot_dir):
+                get.return_value = FakeResponse(304)
+                parse_file(self.job)
+                # Processed before snapshots were enabled, the next run downloads the source in full
+                self.assertEqual((self.job.source_etag, self.job.snapshot_hash), ("", ""))
+                get.return_value = FakeResponse(200, body, {"ETag": '"v1"'})
+                parse_file(self.job)
+                self.assertTrue(self.job.last_run_stats["source_unchanged"])
+                self.assertEqual(self.job.snapshot_hash, self.job.source_hash)
+
+                reprocess_job(self.job.id)
+
+        self.assertEqual(self.job.runs.order_by("id").last().unchanged, 1)
+
+    @mock.patch("life.app.utils.sources.requests.get")
+    def test_reprocess_errors_are_not_sent(self, get):
+        Job.objects.filter(id=self.job.id).update(suppress_emails=False)
+        self.job.refresh_from_db()
+        body = b"id,title,category,phone_1,district,state\n1,Beds,hospital,222,North Goa,Goa\n"
+        get.return_value = FakeResponse(200, body)
+        with tempfile.TemporaryDirectory() as snapshot_dir:
+            with override_settings(LIFE_SNAPSHOT_STORAGE="local", LIFE_SNAPSHOT_DIR=snapshot_dir):
+                parse_file(self.job)
+                next_runtime = self.job.next_runtime
+                district = District.objects.get(name="North Goa")
+                district.name = "Old Goa"
+                district.save()
+                Job.objects.filter(id=self.job.id).update(email_next_sendtime=now() - timedelta(minutes=1))
+
+                reprocess_job(self.job.id)
+
+        self.job.refresh_from_db()
+        # The errors are shown in the admin but not sent to the partner
+        self.assertEqual(self.job.error_counts, {"unknown_district": 1})
+        self.assertIn("North Goa", self.job.last_errors)
+        self.assertEqual(self.job.runs.order_by("id").last().errors, 1)
+        self.assertEqual(mail.outbox, [])
+        # The next fetch of the source is not delayed
+        self.assertEqual(self.job.next_runtime, next_runtime)
+
+    @mock.patch("life.app.tasks.job_executor.reprocess_job.delay")
+    @mock.patch("life.app.utils.sources.requests.get")
+    def test_jobs_without_snapshot_are_not_reprocessed(self, get, delay):
+        get.return_value = FakeResponse(200, b"id,title,category,phone_1,district,state\n")
+        parse_file(self.job)
+        request = RequestFactory().post("/")
+
+        with mock.patch.object(JobAdmin, "message_user") as message_user:
+            JobAdmin(Job, site).reprocess(request, Job.objects.all())
+
+        delay.assert_not_called()
+        self.assertEqual(message_user.call_args_list[0][0][1], "0 jobs will be reprocessed from their last snapshot")
+        self.assertIn("Snapshots are not enabled", message_user.call_args_list[1][0][1])
+        with tempfile.TemporaryDirectory() as snapshot_dir:
+            with override_settings(LIFE_SNAPSHOT_STORAGE="local", LIFE_SNAPSHOT_DIR=snapshot_dir):
+                with self.assertRaisesRegex(CommandError, "No snapshot of the last processed source is stored"):
+                    call_command("reprocess_job", self.job.id, "--async")
+        delay.assert_not_called()
+
+    @override_settings(LIFE_INGEST_BATCH_SIZE=1)
+    @mock.patch("life.app.utils.sources.requests.get")
+    def test_resume_from_checkpoint(self, get):
+        body = (
+            b"id,title,category,phone_1,district,state\n"
+            b"1,Cylinders,oxygen,111,North Goa,Goa\n"
+            b"2,Beds,hospital,222,North Goa,Goa\n"
+            b"3,Beds,hospital,222,North Goa,Goa\n"
+        )
+        get.return_value = FakeResponse(200, body)
+        written = []
+
+        def interrupted_write_batch(*args):
+            if written:
+                raise Exception("Killed")
+            written.append(args)
+            write_batch(*args)
+
+        with mock.patch("life.app.tasks.job_executor.write_batch", side_effect=interrupted_write_batch):
+            parse_file(self.job)
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.checkpoint_row, self.job.source_hash), (2, ""))
+
+        with mock.patch("life.app.tasks.job_executor.write_batch", wraps=write_batch) as wrapped:
+            parse_file(self.job)
+
+        self.job.refresh_from_db()
+        self.assertEqual(wrapped.call_count, 2)
+        self.assertEqual((self.job.checkpoint_row, self.job.checkpoint_hash), (0, ""))
+        self.assertEqual(self.job.last_run_stats["resumed"], 1)
+        rows = self.job.lifedata_set.order_by("data_id")
+        self.assertEqual([(row.data_id, row.is_duplicate) for row in rows], [("1", False), ("2", True), ("3", False)])
+
+
+def run_chord(header):
+    # Runs the shards and the finalize of a sharded ingest in the current process
+    return lambda body: body.apply(([shard.apply().get() for shard in header],))
+
+
+def run_chord_reversed(header):
+    # Workers may complete the shards in any order
+    return lambda body: body.apply((list(reversed([shard.apply().get() for shard in reversed(header)])),))
+
+
+def run_chord_redelivered(header):
+    # A shard task runs again when its worker is lost before acknowledging it
+    def run(body):
+        for shard in header:
+            shard.apply().get()
+        return body.apply(([shard.apply().get() for shard in header],))
+
+    return run
+
+
+@override_settings(LIFE_SHARD_SIZE=0)
+@mock.patch("life.app.tasks.job_executor.chord", run_chord)
+class TestShardedIngest(DBTestCase):
+    def setUp(self):
+        self.state = State.objects.create(name="Goa")
+        District.objects.create(state=self.state, name="North Goa")
+        self.job = Job.objects.create(
+            file_url="https://example.com/sheet.csv",
+            contact_email="a@example.com",
+            suppress_emails=True,
+            sharded_ingest=True,
+        )
+
+    @mock.patch("life.app.utils.sources.requests.get")
+    def test_sharded_ingest(self, get):
+        body = (
+            b"id,title,category,phone_1,district,state\n"
+            b"1,Cylinders,oxygen,111,North Goa,Goa\n"
+            b'2,"Beds\nICU",hospital,222,North Goa,Goa\n'
+            b"3,Beds,hospital,222,North Goa,Goa\n"
+            b"4,Beds,hospital,333,Nowhere,Goa\n"
+        )
+        get.return_value = FakeResponse(200, body)
+        parse_file(self.job)
+        get.return_value = FakeResponse(200, body.replace(b"1,Cylinders,oxygen,111,North Goa,Goa\n", b""))
+        parse_file(self.job)
+
+        self.job.refresh_from_db()
+        rows = self.job.lifedata_set.order_by("data_id")
+        self.assertEqual([row.data_id for row in rows], ["2", "3"])
+        # Row 3 comes after row 2 in the source
+        self.assertEqual([row.is_duplicate for row in rows], [True, False])
+        self.assertEqual(rows[0].data["title"], "Beds\nICU")
+        self.assertEqual(self.job.status, JobStatus.PENDING.value)
+        self.assertEqual(list(self.job.errors.values_list("row", "code")), [(4, "unknown_district")])
+        first, second = self.job.runs.order_by("id")
+        self.assertEqual((first.inserted, first.errors), (3, 1))
+        self.assertEqual((second.unchanged, second.removed), (2, 1))
+        self.assertIn("split", first.stages)
+        # Every stage is shown in the run history of the job
+        self.assertLessEqual(set(first.stages), set(RUN_STAGES))
+
+    @mock.patch("life.app.utils.sources.requests.get")
+    def test_redelivered_shards(self, get):
+        body = (
+            b"id,title,category,phone_1,district,state\n"
+            b"1,Cylinders,oxygen,111,North Goa,Goa\n"
+            b"2,Beds,hospital,222,North Goa,Goa\n"
+        )
+        get.return_value = FakeResponse(200, body)
+
+        with mock.patch("life.app.tasks.job_executor.chord", run_chord_redelivered):
+            parse_file(self.job)
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, JobStatus.PENDING.value)
+        self.assertEqual(list(self.job.lifedata_set.order_by("data_id").values_list("data_id", flat=True)), ["1", "2"])
+        self.assertFalse(self.job.errors.exists())
+        # The shards are removed once the run is finalized
+        self.assertIsNone(cache.get(get_shard_cache_key(self.job.id, self.job.generation, 0)))
+
+    @mock.patch("life.app.utils.sources.requests.get")
+    def test_shards_written_out_of_order(self, get):
+        body = (
+            b"id,title,category,phone_1,district,state\n"
+            b"1,Beds,hospital,222,North Goa,Goa\n"
+            b"2,Beds,hospital,222,North Goa,Goa\n"
+            b"2,ICU Beds,hospital,333,North Goa,Goa\n"
+            b"3,Beds,hospital,222,North Goa,Goa\n"
+        )
+        get.return_value = FakeResponse(200, body)
+
+        with mock.patch("life.app.tasks.job_executor.chord", run_chord_reversed):
+            parse_file(self.job)
+
+        rows = self.job.lifedata_set.order_by("data_id")
+        # Flagged like when the rows are written in order, the last row with a repeated id is kept
+        self.assertEqual(
+            [(row.data_id, row.data["title"], row.is_duplicate) for row in rows],
+            [("1", "Beds", True), ("2", "ICU Beds", False), ("3", "Beds", False)],
+        )
+
+
+class TestInterleavedShards(TransactionTestCase):
+    # States and districts are created by a migration
+    serialized_rollback = True
+
+    def test_last_row_in_source_order_wins(self):
+        state = State.objects.create(name="Goa")
+        district = District.objects.create(state=state, name="North Goa")
+        job = Job.objects.create(file_url="https://example.com/sheet.csv", contact_email="a@example.com", generation=2)
+        LifeData.objects.create(
+            created_job=job, data_id="2", category="hospital", phone_1="222", state=state, district=district
+        )
+
+        def get_batch(title, row_number):
+            return [
+                ({"id": "2", "title": title, "category": "hospital", "phone_1": "222"}, state, district, row_number)
+            ]
+
+        def write_later_shard():
+            write_batch(job, get_batch("ICU Beds", 4), DeferredDuplicates(), Counter())
+            connection.close()
+
+        later_shard = threading.Thread(target=write_later_shard)
+
+        def validate_then_write_later_shard(*args):
+            if later_shard.ident is None and threading.current_thread() is threading.main_thread():
+                # The shard holding the later row writes it while this shard has read the row but not written it
+                later_shard.start()
+                later_shard.join(0.5)
+            return get_validated_object(*args)
+
+        with mock.patch("life.app.tasks.job_executor.get_validated_object", validate_then_write_later_shard):
+            write_batch(job, get_batch("Beds", 3), DeferredDuplicates(), Counter())
+        later_shard.join()
+
+        row = job.lifedata_set.get()
+        self.assertEqual((row.data["title"], row.source_row, row.generation), ("ICU Beds", 4, 2))
+        # An unchanged row is stamped with its row number in the next run too
+        job.generation = 3
+        stats = Counter()
+        write_batch(job, get_batch("ICU Beds", 2), DeferredDuplicates(), stats)
+        row.refresh_from_db()
+        self.assertEqual((stats["unchanged"], row.source_row, row.generation), (1, 2, 3))
@@ -0,0 +1,32 @@
+from django.test import TestCase
+
+from life.app.utils.location_resolver import get_location_resolver
+from life.users.models import District, State
+
+
+class TestLocationResolver(TestCase):
+    def setUp(self):
+        self.karnataka = State.objects.create(name="Karnataka")
+        self.tamil_nadu = State.objects.create(name="Tamil Nadu")
+        self.rural = District.objects.create(state=self.karnataka, name="Bengaluru (Bangalore) Rural")
+        self.urban = District.objects.create(state=self.karnataka, name="Bengaluru (Bangalore) Urban")
+        self.chennai = District.objects.create(state=self.tamil_nadu, name="Chennai")
+
+    def test_matches_like_icontains(self):
+        resolver = get_location_resolver()
+        self.assertEqual(resolver.get_state("karnataka"), self.karnataka)
+        self.assertEqual(resolver.get_state(" KARNA "), self.karnataka)
+        self.assertEqual(resolver.get_district("bangalore", self.karnataka), self.rural)
+        self.assertEqual(resolver.get_district("Bengaluru (Bangalore) Urban", self.karnataka), self.urban)
+        self.assertIsNone(resolver.get_district("Chennai", self.karnataka))
+        self.assertIsNone(resolver.get_state("Goa"))
+
+    def test_aliases(self):
+        resolver = get_location_resolver()
+        self.assertEqual(resolver.get_state("TN"), self.tamil_nadu)
+        self.assertEqual(resolver.get_district("Madras", self.tamil_nadu), self.chennai)
+
+    def test_reloads_when_tables_change(self):
+        self.assertIsNone(get_location_resolver().get_state("Goa"))
+        goa = State.objects.create(name="Goa")
+        self.assertEqual(get_location_resolver().get_state("Goa"), goa)
@@ -0,0 +1,81 @@
+from unittest import TestCase
+
+from life.app.tasks.job_executor import get_mapping
+from life.app.utils.errors import RowError
+
+
+class TestGetMapping(TestCase):
+    def test_exact_headers(self):
+        mapping = get_mapping([" id", "title", "category", "phone_1", "district", "state", "", "Hospital"])
+
+        data = mapping(["1", "Beds", "hospital", "111", "North Goa", "Goa", "ignored", "GMC"])
+
+        self.assertEqual(
+            data,
+            {
+                "id": "1",
+                "title": "Beds",
+                "category": "hospital",
+                "phone_1": "111",
+                "district": "North Goa",
+                "state": "Goa",
+                "Hospital": "GMC",
+            },
+        )
+
+    def test_default_aliases(self):
+        mapping = get_mapping(["क्रमांक", "नाम", "श्रेणी", "मोबाइल नंबर", " Dist. ", "राज्य", "Phone"])
+
+        data = mapping(["1", "Beds", "hospital", "111", "North Goa", "Goa", "222"])
+
+        self.assertEqual(
+            (data["id"], data["title"], data["phone_1"], data["district"]), ("1", "Beds", "111", "North Goa")
+        )
+        # Only the first alias of a key is used
+        self.assertEqual(data["Phone"], "222")
+
+    def test_optional_headers_are_kept(self):
+        header = ["id", "title", "category", "phone_1", "district", "state", "Comments", "URL", "Quantity"]
+
+        data = get_mapping(header)(["1", "Beds", "hospital", "111", "North Goa", "Goa", "Call first", "x", "2"])
+
+        self.assertEqual((data["Comments"], data["URL"], data["Quantity"]), ("Call first", "x", "2"))
+        self.assertNotIn("comment", data)
+        # Renamed by the profile of the job
+        data = get_mapping(header, {"aliases": {"comment": ["comments"]}})(
+            ["1", "Beds", "hospital", "111", "North Goa", "Goa", "Call first", "x", "2"]
+        )
+        self.assertEqual(data["comment"], "Call first")
+
+    def test_profile(self):
+        profile = {
+            "aliases": {"title": ["Facility"]},
+            "columns": {"id": 0, "state": 5},
+            "normalizers": {"phone_1": ["digits"], "title": ["strip", "collapse_spaces"]},
+        }
+        mapping = get_mapping(["", "Facility", "category", "phone_1", "district", "???"], profile)
+
+        data = mapping(["7", "  Oxygen   Beds ", "hospital", "+91 111", "North Goa", "Goa"])
+
+        self.assertEqual(data["id"], "7")
+        self.assertEqual(data["state"], "Goa")
+        self.assertEqual(data["title"], "Oxygen Beds")
+        self.assertEqual(data["phone_1"], "91111")
+        self.assertNotIn("???", data)
+
+    def test_missing_header(self):
+        with self.assertRaises(RowError):
+            get_mapping(["id", "title", "category", "district", "state"])
+
+    def test_invalid_profile(self):
+        header = ["id", "title", "category", "phone_1", "district", "state"]
+        with self.assertRaises(Exception):
+            get_mapping(header, {"columns": {"id": 10}})
+        with self.assertRaises(Exception):
+            get_mapping(header, {"normalizers": {"id": ["reverse"]}})
+
+    def test_short_row(self):
+        mapping = get_mapping(["id", "title", "category", "phone_1", "district", "state"])
+
+        with self.assertRaises(IndexError):
+            mapping(["1", "Beds"])
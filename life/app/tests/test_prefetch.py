@@ -0,0 +1,79 @@
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from life.app.models import Job
+from life.app.utils.benchmark import serve_files
+from life.app.utils.prefetch import get_prefetch_cache_key, get_source, prefetch_sources
+
+
+class StalledHandler(BaseHTTPRequestHandler):
+    # Alive but slow: sends a byte of the body every 100ms
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "100")
+        self.end_headers()
+        for _ in range(100):
+            self.wfile.write(b"x")
+            self.wfile.flush()
+            time.sleep(0.1)
+
+    def log_message(self, *args):
+        pass
+
+
+@mock.patch("life.app.utils.prefetch.RETRY_DELAY", 0)
+@override_settings(LIFE_PREFETCH_RETRIES=1, LIFE_PREFETCH_MAX_SIZE=1)
+class TestPrefetchSources(SimpleTestCase):
+    def test_sources_are_handed_to_workers(self):
+        body = b"id,title\n1,Oxygen\n"
+        with serve_files() as (files, base_url):
+            files["/new.csv"] = body
+            files["/same.csv"] = b"id,title\n"
+            files["/large.csv"] = b"x" * (1024 * 1024 + 1)
+            jobs = [
+                Job(id=1, file_url=f"{base_url}/new.csv"),
+                Job(id=2, file_url=f"{base_url}/same.csv"),
+                Job(id=3, file_url=f"{base_url}/missing.csv"),
+                Job(id=4, file_url=f"{base_url}/large.csv"),
+            ]
+            jobs[1].source_etag = f'"{hashlib.sha256(files["/same.csv"]).hexdigest()}"'
+            prefetched = []
+
+            prefetch_sources(jobs, on_prefetched=prefetched.append)
+
+            self.assertEqual(sorted(job.id for job in prefetched), [1, 2, 3, 4])
+            with get_source(jobs[0]) as source:
+                self.assertEqual(b"".join(source.iter_chunks()), body)
+                self.assertEqual(source.sha256, hashlib.sha256(body).hexdigest())
+            self.assertIsNone(get_source(jobs[1]))
+            with self.assertRaises(Exception):
+                get_source(jobs[2])
+            # Too large to be prefetched, the worker downloads it itself
+            with mock.patch("life.app.utils.prefetch.fetch_source") as fetch_source:
+                get_source(jobs[3])
+                fetch_source.assert_called_once_with(jobs[3], heartbeat=None)
+
+    @override_settings(LIFE_PREFETCH_TIMEOUT=1)
+    def test_stalled_sources_are_left_to_workers(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StalledHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            job = Job(id=5, file_url=f"http://127.0.0.1:{server.server_port}/slow.csv")
+            prefetched = []
+            started = time.monotonic()
+
+            prefetch_sources([job], on_prefetched=prefetched.append)
+
+            self.assertLess(time.monotonic() - started, 5)
+            self.assertEqual(prefetched, [job])
+            # The worker downloads it while sending heartbeats
+            self.assertIsNone(cache.get(get_prefetch_cache_key(job.id)))
+        finally:
+            server.shutdown()
+            server.server_close()
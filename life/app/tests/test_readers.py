@@ -0,0 +1,58 @@
+import csv
+import gzip
+import io
+import json
+import tempfile
+from unittest import TestCase
+
+import openpyxl
+
+from life.app.utils.readers import get_source_format, iter_decoded_lines, read_source_rows
+from life.app.utils.sources import DownloadedSource
+
+
+def make_source(body, url="https://example.com/sheet", content_type=""):
+    file = tempfile.SpooledTemporaryFile()
+    file.write(body)
+    return DownloadedSource(file, "", content_type=content_type, url=url)
+
+
+class TestIterDecodedLines(TestCase):
+    def test_lines_split_across_chunks(self):
+        body = 'id,title\r\n1,"Oxygen\r\nCylinder"\r\n2,ಆಮ್ಲಜನಕ\r\n3,last'.encode("utf-8")
+        # Split at every byte to cover multi-byte characters and "\r\n" pairs broken across chunks
+        chunks = [body[i : i + 1] for i in range(len(body))]
+
+        rows = list(csv.reader(iter_decoded_lines(chunks)))
+
+        self.assertEqual(rows, [["id", "title"], ["1", "Oxygen\r\nCylinder"], ["2", "ಆಮ್ಲಜನಕ"], ["3", "last"]])
+
+
+class TestReadSourceRows(TestCase):
+    def test_gzip_csv(self):
+        source = make_source(gzip.compress(b"id,title\n1,Oxygen\n"), url="https://example.com/dump.csv.gz")
+
+        self.assertEqual(list(read_source_rows(source)), [["id", "title"], ["1", "Oxygen"]])
+
+    def test_ndjson(self):
+        lines = [{"id": 1, "title": "Oxygen"}, {"id": 2, "phone_1": "111", "verified": True}]
+        body = "\n".join(json.dumps(line) for line in lines).encode("utf-8")
+        source = make_source(body, content_type="application/x-ndjson; charset=utf-8")
+
+        self.assertEqual(
+            list(read_source_rows(source)),
+            [["id", "title", "phone_1", "verified"], ["1", "Oxygen", "", ""], ["2", "", "111", "true"]],
+        )
+
+    def test_xlsx(self):
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(["id", "title", "phone_1"])
+        sheet.append([1, "Oxygen", 9876543210])
+        sheet.append([None, None, None])
+        body = io.BytesIO()
+        workbook.save(body)
+        source = make_source(body.getvalue(), content_type="application/octet-stream")
+
+        self.assertEqual(get_source_format(source), ("xlsx", False))
+        self.assertEqual(list(read_source_rows(source)), [["id", "title", "phone_1"], ["1", "Oxygen", "9876543210"]])
@@ -0,0 +1,66 @@
+import csv
+import io
+from types import SimpleNamespace
+from unittest import TestCase, mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from life.app.utils.sharding import delete_shards, get_shard, get_shard_cache_key, split_csv, store_shards
+
+BODY = b'id,title\n1,"Beds\nICU"\n2,"Say ""hi""\n"\n3,Cylinders\n4,Concentrators'
+
+
+def chunked(body, size):
+    return [body[i : i + size] for i in range(0, len(body), size)]
+
+
+class TestSplitCsv(TestCase):
+    def test_shards_end_on_record_boundaries(self):
+        for chunk_size in [1, 3, 1000]:
+            shards = list(split_csv(chunked(BODY, chunk_size), 1))
+
+            self.assertEqual([first_row for _, first_row, _ in shards], [2, 3, 4, 5])
+            rows = [
+                row
+                for header, _, shard in shards
+                for row in list(csv.reader(io.StringIO((header + shard).decode())))[1:]
+            ]
+            self.assertEqual(rows, list(csv.reader(io.StringIO(BODY.decode())))[1:])
+
+    def test_shard_size(self):
+        shards = list(split_csv(chunked(BODY, 4), 20))
+
+        self.assertEqual([first_row for _, first_row, _ in shards], [2, 4])
+        self.assertEqual(shards[0][0], b"id,title\n")
+        self.assertEqual(b"".join(shard for _, _, shard in shards), BODY[len(b"id,title\n") :])
+
+    def test_header_only(self):
+        self.assertEqual(list(split_csv([b"id,title\n"], 1)), [])
+
+
+@override_settings(LIFE_SHARD_SIZE=0)
+class TestStoreShards(SimpleTestCase):
+    def setUp(self):
+        self.job = SimpleNamespace(id=1, generation=2)
+        cache.clear()
+
+    def test_shards_are_kept_until_deleted(self):
+        self.assertEqual(store_shards(self.job, chunked(BODY, 4)), [2, 3, 4, 5])
+
+        # A redelivered shard task reads its shard again
+        for _ in range(2):
+            self.assertEqual(get_shard(1, 2, 1), b'id,title\n2,"Say ""hi""\n"\n')
+        delete_shards(1, 2, 4)
+        with self.assertRaisesRegex(Exception, "Shard 1 of the source has expired"):
+            get_shard(1, 2, 1)
+
+    def test_shard_not_stored(self):
+        add = cache.add
+        with mock.patch.object(cache, "add", side_effect=lambda key, *args: not key.endswith("_2") and add(key, *args)):
+            with self.assertRaisesRegex(Exception, "Shard 2 of the source could not be stored"):
+                store_shards(self.job, [BODY])
+
+        # The shards stored before are removed
+        self.assertIsNone(cache.get(get_shard_cache_key(1, 2, 0)))
+        self.assertIsNone(cache.get(get_shard_cache_key(1, 2, 1)))
@@ -0,0 +1,97 @@
+import hashlib
+import itertools
+from unittest import TestCase, mock
+
+from life.app.models import Job
+from life.app.utils.sources import PublicHTTPConnection, TimeBudgetExceeded, fetch_source, get_public_session
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=b"", headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def iter_content(self, chunk_size=None):
+        return iter([self.body[i : i + 4] for i in range(0, len(self.body), 4)])
+
+    def raise_for_status(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class TestFetchSource(TestCase):
+    def setUp(self):
+        self.job = Job(file_url="https://example.com/sheet.csv", source_etag='"v1"', source_last_modified="yesterday")
+
+    @mock.patch("life.app.utils.sources.requests.get")
+    def test_not_modified(self, get):
+        get.return_value = FakeResponse(304)
+
+        self.assertIsNone(fetch_source(self.job))
+        headers = get.call_args[1]["headers"]
+        self.assertEqual(headers, {"If-None-Match": '"v1"', "If-Modified-Since": "yesterday"})
+
+    @mock.patch("life.app.utils.sources.requests.get")
+    def test_download(self, get):
+        body = b"id,title\n1,Oxygen\n"
+        get.return_value = FakeResponse(200, body, {"ETag": '"v2"'})
+
+        with fetch_source(self.job) as source:
+            self.assertEqual(source.sha256, hashlib.sha256(body).hexdigest())
+            self.assertEqual(source.etag, '"v2"')
+            self.assertEqual(b"".join(source.iter_chunks()), body)
+
+    @mock.patch("life.app.utils.sources.requests.get")
+    def test_max_download_size(self, get):
+        self.job.max_download_size = 0
+        get.return_value = FakeResponse(200, b"id,title\n")
+
+        with self.assertRaises(Exception):
+            fetch_source(self.job)
+
+    @mock.patch("life.app.utils.sources.requests.get")
+    def test_heartbeat(self, get):
+        heartbeat = mock.Mock()
+        get.return_value = FakeResponse(200, b"id,title\n1,Oxygen\n")
+
+        fetch_source(self.job, heartbeat=heartbeat)
+
+        # Sent for every chunk so that a slow download is not taken for a stuck job
+        self.assertEqual(heartbeat.call_count, 5)
+
+    @mock.patch("life.app.utils.sources.time.monotonic", side_effect=itertools.count())
+    @mock.patch("life.app.utils.sources.requests.get")
+    def test_deadline(self, get, monotonic):
+        get.return_value = FakeResponse(200, b"id,title\n" * 10)
+
+        with self.assertRaises(TimeBudgetExceeded):
+            fetch_source(self.job, deadline=5)
+        self.assertLessEqual(get.call_args[1]["timeout"], 5)
+
+
+def resolve_to(*addresses):
+    return lambda host, port, **kwargs: [(2, 1, 6, "", (address, port)) for address in addresses]
+
+
+class TestPublicSession(TestCase):
+    @mock.patch("life.app.utils.sources.create_connection")
+    @mock.patch("life.app.utils.sources.socket.getaddrinfo", resolve_to("93.184.216.34"))
+    def test_connects_to_the_checked_address(self, create_connection):
+        PublicHTTPConnection("example.com", 80).connect()
+
+        self.assertEqual(create_connection.call_args[0][0], ("93.184.216.34", 80))
+
+    @mock.patch("life.app.utils.sources.create_connection")
+    def test_private_addresses_are_not_connected_to(self, create_connection):
+        for addresses in [("169.254.169.254",), ("93.184.216.34", "127.0.0.1")]:
+            with mock.patch("life.app.utils.sources.socket.getaddrinfo", resolve_to(*addresses)):
+                # Redirects are followed with the same connections, so a redirect to the host fails the same way
+                with self.assertRaisesRegex(Exception, "is not a public host"):
+                    get_public_session().get("http://redirected.example.com/latest/meta-data/")
+        create_connection.assert_not_called()
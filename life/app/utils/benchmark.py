@@ -0,0 +1,203 @@
+import csv
+import hashlib
+import io
+import json
+import random
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from botocore.exceptions import ClientError
+from django.db import connection
+
+from life.users.models import District, State
+
+# Share of the rows repeating the phone number, category and location of an earlier row
+DUPLICATE_RATE = 0.1
+# Share of the rows failing validation
+ERROR_RATE = 0.02
+# Share of the rows edited between two revisions of a sheet
+CHANGE_RATE = 0.1
+
+CSV_HEADER = ["id", "title", "category", "phone_1", "district", "state", "address", "verified_by", "pincode"]
+CATEGORIES = ["oxygen", "medicine", "hospital", "ambulance", "helpline", "vaccine", "food"]
+
+
+def load_locations(json_file_path):
+    """
+    Returns [(state, [districts])] from a states and districts JSON like data/india/states-and-districts.json
+    """
+    with open(json_file_path, "r") as json_file:
+        data = json.load(json_file)
+    return [(item["state"].strip(), [d.strip() for d in item["districts"].split(",")]) for item in data]
+
+
+def create_locations(locations):
+    for state_name, districts in locations:
+        state, _ = State.objects.get_or_create(name__iexact=state_name, defaults={"name": state_name})
+        for district_name in districts:
+            District.objects.get_or_create(state=state, name__iexact=district_name, defaults={"name": district_name})
+
+
+def misspell(rng, name):
+    """
+    Spelling variations seen in submitted sheets, all of them resolvable to the original name
+    """
+    variant = rng.random()
+    if variant < 0.2:
+        return name.lower()
+    if variant < 0.3:
+        return name.upper()
+    if variant < 0.4:
+        return f" {name} "
+    if variant < 0.5 and " (" in name:
+        return name.split(" (")[0]
+    return name
+
+
+def generate_csv(row_count, locations, seed=0, revision=0):
+    """
+    Generates a job sheet of row_count rows with duplicates, bad rows and misspelled locations.
+    Sheets generated with the same seed share their rows, a later revision edits a part of them.
+    """
+    rng = random.Random(seed)
+    edits = random.Random(f"{seed}-{revision}")
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(CSV_HEADER)
+    previous = []
+    for i in range(1, row_count + 1):
+        if previous and rng.random() < DUPLICATE_RATE:
+            category, phone, state, district = rng.choice(previous)
+        else:
+            state, districts = rng.choice(locations)
+            category, district = rng.choice(CATEGORIES), rng.choice(districts)
+            phone = str(rng.randrange(10 ** 9, 10 ** 10))
+            previous.append((category, phone, state, district))
+        title = f"Resource {i}"
+        error = rng.random()
+        if error < ERROR_RATE / 3:
+            title = ""
+        elif error < ERROR_RATE * 2 / 3:
+            category = "unknown"
+        elif error < ERROR_RATE:
+            district = "Nowhere"
+        if revision and edits.random() < CHANGE_RATE:
+            title = f"{title} (revision {revision})"
+        writer.writerow(
+            [
+                i,
+                title,
+                category,
+                phone,
+                misspell(rng, district),
+                misspell(rng, state),
+                f"{rng.randrange(1, 500)}, Main Road",
+                rng.choice(["", "volunteer", "helpline"]),
+                str(rng.randrange(100000, 999999)),
+            ]
+        )
+    return output.getvalue().encode("utf-8")
+
+
+class SourceHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = self.server.files.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        etag = f'"{hashlib.sha256(body).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def serve_files():
+    """
+    Local HTTP server for job sources, files are served from the dict of path to body yielded with the base url
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SourceHandler)
+    server.files = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server.files, f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@contextmanager
+def measure(rows, results):
+    """
+    Records the duration, rows per second, number of queries and peak RSS of the enclosed block into results.
+    ru_maxrss is the peak of the whole process, so measurements have to be made from the smallest to the largest.
+    """
+    queries = []
+
+    def count_queries(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    with connection.execute_wrapper(count_queries):
+        yield
+    duration = time.perf_counter() - started
+    results.update(
+        rows=rows,
+        duration=round(duration, 3),
+        rows_per_second=round(rows / duration, 1) if duration else None,
+        queries=len(queries),
+        peak_rss_mb=round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    )
+
+
+@contextmanager
+def mock_s3():
+    """
+    Keeps exports from being uploaded, the bodies are still built as they would be for S3
+    """
+    with mock.patch("life.app.tasks.job_executor.boto3") as boto3:
+        # No previous export exists
+        boto3.client.return_value.get_object.side_effect = ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        yield boto3
+
+
+# Metrics where a higher value is better, every other metric is better when lower
+HIGHER_IS_BETTER = {"rows_per_second"}
+COMPARED_METRICS = ["rows_per_second", "queries", "peak_rss_mb"]
+
+
+def compare_results(baseline, results, tolerance):
+    """
+    Returns (size, stage, metric, baseline value, value, change in %, is regression) for every measurement
+    that also exists in the baseline. Changes within tolerance % are not regressions.
+    """
+    comparison = []
+    for size, stages in results.items():
+        for stage, metrics in stages.items():
+            baseline_metrics = baseline.get(size, {}).get(stage)
+            if not baseline_metrics:
+                continue
+            for metric in COMPARED_METRICS:
+                old, new = baseline_metrics.get(metric), metrics.get(metric)
+                if not old or new is None:
+                    continue
+                change = (new - old) * 100 / old
+                regression = -change > tolerance if metric in HIGHER_IS_BETTER else change > tolerance
+                comparison.append((size, stage, metric, old, new, round(change, 1), regression))
+    return comparison
@@ -0,0 +1,144 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from life.app.models import LifeData
+from life.app.utils.exports import mark_categories_changed
+
+
+def normalize_phone(phone):
+    return phone.strip()
+
+
+def get_duplicate_key(category, phone_1, state_id, district_id):
+    return (category, normalize_phone(phone_1), state_id, district_id)
+
+
+class DuplicateIndex:
+    """
+    In memory replacement for the per row duplicate queries of a job run.
+
+    Rows sharing (category, phone_1, state, district) are duplicates of each other; whenever a row of the job
+    is new or has changed, every other row in its group is marked as duplicate.
+    The keys of all rows of a category are loaded the first time the category is seen. Rows of the job being
+    run are tracked by data_id, so that they can be followed before they are written, rows of other jobs by pk.
+    Rows that have to be marked as duplicate are collected and updated in one query by apply().
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.groups = defaultdict(set)
+        self.row_keys = {}
+        self.loaded_categories = set()
+        self.duplicates = set()
+
+    def load_category(self, category):
+        rows = LifeData.objects.filter(category=category).values_list(
+            "pk", "created_job_id", "data_id", "phone_1", "state_id", "district_id"
+        )
+        for pk, job_id, data_id, phone_1, state_id, district_id in rows:
+            key = get_duplicate_key(category, phone_1, state_id, district_id)
+            if job_id == self.job.id:
+                if data_id in self.row_keys:
+                    # Already moved by this run, the database is behind
+                    continue
+                self.row_keys[data_id] = key
+                self.groups[key].add(data_id)
+            else:
+                self.groups[key].add(pk)
+        self.loaded_categories.add(category)
+
+    def resolve(self, data_id, key, has_changed, is_duplicate):
+        """
+        Returns the is_duplicate flag of the row of this job with the given data_id, which is about to be written
+        with the given key. is_duplicate is the flag currently stored for the row.
+        """
+        if key[0] not in self.loaded_categories:
+            self.load_category(key[0])
+        group = self.groups[key]
+        if group:
+            if has_changed:
+                self.duplicates.update(group)
+                is_duplicate = False
+            else:
+                is_duplicate = is_duplicate or data_id in self.duplicates
+        else:
+            is_duplicate = False
+        # The flag written with the row takes precedence over earlier flips
+        self.duplicates.discard(data_id)
+
+        previous_key = self.row_keys.get(data_id)
+        if previous_key is not None and previous_key != key:
+            self.groups[previous_key].discard(data_id)
+        group.add(data_id)
+        self.row_keys[data_id] = key
+        return is_duplicate
+
+    def apply(self):
+        data_ids = [token for token in self.duplicates if isinstance(token, str)]
+        pks = [token for token in self.duplicates if not isinstance(token, str)]
+        if data_ids or pks:
+            rows = LifeData.objects.filter(
+                Q(pk__in=pks) | Q(created_job=self.job, data_id__in=data_ids), is_duplicate=False
+            )
+            categories = set(rows.values_list("category", flat=True).distinct())
+            rows.update(is_duplicate=True)
+            # The flipped rows leave the exports of their categories
+            mark_categories_changed(categories)
+        self.duplicates = set()
+
+
+class DeferredDuplicates:
+    """
+    Duplicate resolution for the shards of a sharded ingest, which are written concurrently.
+    Changed rows are written as not duplicate and unchanged rows keep their flag, the groups of the changed rows
+    are resolved by sweep_duplicates() once every shard is written.
+    """
+
+    def resolve(self, data_id, key, has_changed, is_duplicate):
+        return False if has_changed else is_duplicate
+
+    def apply(self):
+        pass
+
+
+def sweep_duplicates(job, generation, heartbeat=None):
+    """
+    Marks as duplicate every row sharing its group with a row of the job changed in the given generation.
+    The changed row of a group that comes last in the source is kept, like when the rows are written in order.
+    heartbeat is called for every row read and every batch updated.
+    """
+    winners = {}
+    changed = LifeData.objects.filter(created_job=job, changed_generation=generation).values_list(
+        "pk", "source_row", "category", "phone_1", "state_id", "district_id"
+    )
+    for pk, source_row, category, phone_1, state_id, district_id in changed:
+        if heartbeat:
+            heartbeat()
+        key = get_duplicate_key(category, phone_1, state_id, district_id)
+        winners[key] = max(winners.get(key, (source_row, pk)), (source_row, pk))
+    winners = {key: pk for key, (_, pk) in winners.items()}
+    duplicates = []
+    categories = set()
+    for category in {key[0] for key in winners}:
+        rows = LifeData.objects.filter(category=category, is_duplicate=False).values_list(
+            "pk", "phone_1", "state_id", "district_id"
+        )
+        for pk, phone_1, state_id, district_id in rows:
+            if heartbeat:
+                heartbeat()
+            winner = winners.get(get_duplicate_key(category, phone_1, state_id, district_id))
+            if winner is not None and winner != pk:
+                duplicates.append(pk)
+                categories.add(category)
+    with transaction.atomic():
+        for start in range(0, len(duplicates), settings.LIFE_INGEST_BATCH_SIZE):
+            if heartbeat:
+                heartbeat()
+            LifeData.objects.filter(pk__in=duplicates[start : start + settings.LIFE_INGEST_BATCH_SIZE]).update(
+                is_duplicate=True
+            )
+    mark_categories_changed(categories)
+    return len(duplicates)
@@ -0,0 +1,75 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+
+from life.app.models import JobError, JobErrorCode
+
+# Number of errors listed in last_errors and in the email sent for a run
+REPORTED_ERRORS = 100
+
+
+class RowError(Exception):
+    def __init__(self, code, message, field=""):
+        super().__init__(message)
+        self.code = code
+        self.field = field
+
+
+class ErrorLog:
+    """
+    Errors of a job run. Only the first LIFE_JOB_MAX_ERRORS errors are kept, all of them are counted per code.
+    """
+
+    def __init__(self):
+        self.errors = []
+        self.counts = Counter()
+
+    def __bool__(self):
+        return bool(self.counts)
+
+    def add(self, code, message, row=None, field=""):
+        self.counts[code.value] += 1
+        if len(self.errors) < settings.LIFE_JOB_MAX_ERRORS:
+            self.errors.append(JobError(row=row, field=field, code=code.value, message=message))
+
+    def add_exception(self, e, row=None):
+        if isinstance(e, RowError):
+            self.add(e.code, str(e), row, e.field)
+        else:
+            self.add(JobErrorCode.INVALID_ROW, str(e), row)
+
+    def dump(self):
+        """
+        JSON serializable form of the log, to be merged into the log of a run with load()
+        """
+        return {
+            "counts": dict(self.counts),
+            "errors": [[error.row, error.field, error.code, error.message] for error in self.errors],
+        }
+
+    def load(self, dump):
+        self.counts.update(dump["counts"])
+        for row, field, code, message in dump["errors"]:
+            if len(self.errors) < settings.LIFE_JOB_MAX_ERRORS:
+                self.errors.append(JobError(row=row, field=field, code=code, message=message))
+
+    def render(self):
+        lines = [f"{count} {code} errors " for code, count in self.counts.most_common()]
+        for error in self.errors[:REPORTED_ERRORS]:
+            lines.append(f"Row {error.row} : {error.message}" if error.row else error.message)
+        hidden = sum(self.counts.values()) - min(len(self.errors), REPORTED_ERRORS)
+        if hidden:
+            lines.append(f"... and {hidden} more errors ")
+        return "\n".join(lines)
+
+    def save(self, job):
+        """
+        Replaces the stored errors of the job with the errors of this run
+        """
+        for error in self.errors:
+            error.job = job
+        with transaction.atomic():
+            JobError.objects.filter(job=job).delete()
+            JobError.objects.bulk_create(self.errors)
+        job.error_counts = dict(self.counts)
@@ -0,0 +1,356 @@
+import io
+import json
+import zlib
+
+import brotli
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from life.app.models import ExportManifest, LifeData
+
+# Fields rendered by LifeDataSerializer in its order, as (key, values() lookup, conversion of the value)
+EXPORT_FIELDS = (
+    ("state", "state__name", None),
+    ("district", "district__name", None),
+    ("state_id", "state_id", str),
+    ("district_id", "district_id", str),
+    ("data_name", "created_job__name", None),
+    ("external_id", "external_id", str),
+    ("data_id", "data_id", None),
+    ("category", "category", None),
+    ("data", "data", None),
+    ("phone_1", "phone_1", None),
+    ("is_duplicate", "is_duplicate", None),
+    ("downvotes", "downvotes", None),
+    ("upvotes", "upvotes", None),
+    ("verifiedAndAvailable", "verifiedAndAvailable", None),
+    ("verifiedAndUnavailable", "verifiedAndUnavailable", None),
+    ("created_job", "created_job_id", None),
+)
+
+
+class MultipartUpload:
+    """
+    Writable S3 object uploaded in parts of LIFE_EXPORT_PART_SIZE MB while it is written, so that only one part
+    is held in memory. Objects smaller than a part are uploaded with a single put.
+    Used as a context manager, the upload is completed on exit and aborted if an exception was raised.
+    """
+
+    def __init__(self, client, bucket, key, part_size=None, **extra_args):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size or settings.LIFE_EXPORT_PART_SIZE * 1024 * 1024
+        self.extra_args = extra_args
+        self.buffer = io.BytesIO()
+        self.upload_id = None
+        self.parts = []
+
+    def write(self, data):
+        self.buffer.write(data)
+        if self.buffer.tell() >= self.part_size:
+            self.upload_part()
+
+    def upload_part(self):
+        if self.upload_id is None:
+            self.upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=self.key, **self.extra_args)[
+                "UploadId"
+            ]
+        part_number = len(self.parts) + 1
+        response = self.client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=self.buffer.getvalue(),
+        )
+        self.parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+        self.buffer = io.BytesIO()
+
+    def complete(self):
+        if self.upload_id is None:
+            self.client.put_object(Bucket=self.bucket, Key=self.key, Body=self.buffer.getvalue(), **self.extra_args)
+            return
+        if self.buffer.tell():
+            self.upload_part()
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, MultipartUpload={"Parts": self.parts}
+        )
+        self.upload_id = None
+
+    def abort(self):
+        if self.upload_id is not None:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.complete()
+        else:
+            self.abort()
+
+
+BROTLI_SMALL_WINDOW = 16
+
+
+class CompressedWriter:
+    def __init__(self, file, compress, finish):
+        self.file = file
+        self.compress = compress
+        self.finish = finish
+
+    def write(self, data):
+        compressed = self.compress(data)
+        if compressed:
+            self.file.write(compressed)
+
+    def close(self):
+        self.file.write(self.finish())
+
+
+def get_compressed_variants():
+    """
+    (extension, Content-Encoding, writer factory) of the precompressed variants uploaded along with exports.
+    Factories take the size of the data to compress when it is known.
+    """
+
+    def gzip_writer(file, size=None):
+        compressor = zlib.compressobj(settings.LIFE_EXPORT_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return CompressedWriter(file, compressor.compress, compressor.flush)
+
+    def brotli_writer(file, size=None):
+        # The default window is much slower to set up, small shards are compressed faster and as well without it
+        lgwin = BROTLI_SMALL_WINDOW if size is not None and size <= 1 << BROTLI_SMALL_WINDOW else 22
+        compressor = brotli.Compressor(quality=settings.LIFE_EXPORT_BROTLI_QUALITY, lgwin=lgwin)
+        return CompressedWriter(file, compressor.process, compressor.finish)
+
+    return [(".gz", "gzip", gzip_writer), (".br", "br", brotli_writer)]
+
+
+class ExportArtifact:
+    """
+    Export uploaded to key while it is written, along with its gzip and brotli variants uploaded to key.gz and
+    key.br with a Content-Encoding. Writes are buffered so that the compressors are fed large chunks.
+    Used as a context manager, the uploads are completed on exit and aborted if an exception was raised.
+    """
+
+    buffer_size = 64 * 1024
+
+    def __init__(self, client, bucket, key, content_type):
+        extra_args = {
+            "ACL": "public-read",
+            "ContentType": content_type,
+            "CacheControl": settings.LIFE_EXPORT_CACHE_CONTROL,
+        }
+        self.uploads = [MultipartUpload(client, bucket, key, **extra_args)]
+        self.compressed_uploads = []
+        for extension, encoding, get_writer in get_compressed_variants():
+            upload = MultipartUpload(client, bucket, f"{key}{extension}", ContentEncoding=encoding, **extra_args)
+            self.uploads.append(upload)
+            self.compressed_uploads.append((upload, get_writer))
+        self.compressed_writers = None
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self, closing=False):
+        data = bytes(self.buffer)
+        if self.compressed_writers is None:
+            # The size of artifacts closed before their buffer first filled up is known
+            size = len(data) if closing else None
+            self.compressed_writers = [get_writer(upload, size) for upload, get_writer in self.compressed_uploads]
+        for writer in [self.uploads[0]] + self.compressed_writers:
+            writer.write(data)
+        self.buffer = bytearray()
+
+    def close(self):
+        try:
+            self.flush(closing=True)
+            for writer in self.compressed_writers:
+                writer.close()
+            for upload in self.uploads:
+                upload.complete()
+        except Exception:
+            self.abort()
+            raise
+
+    def abort(self):
+        for upload in self.uploads:
+            upload.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class ShardedExport:
+    """
+    Per state and per district JSON exports of a category, {category}/{state_id}.json and
+    {category}/{state_id}/{district_id}.json, written in the same pass as the export of the category.
+    Rows have to be written ordered by state and district, only the shards of the current ones are open.
+    The index of the shards is uploaded to {category}/index.json when the export is closed, and the shards listed
+    in the previous index that were not written again are deleted, as clients fetch them by id.
+    """
+
+    def __init__(self, client, bucket, category):
+        self.client = client
+        self.bucket = bucket
+        self.category = category
+        self.states = []
+        self.state = None
+        self.district = None
+
+    def open_shard(self, key, entry):
+        artifact = ExportArtifact(self.client, self.bucket, key, "application/json; charset=utf-8")
+        artifact.write(b"[")
+        entry.update(key=key, rows=0)
+        return artifact, entry
+
+    def close_shard(self, shard):
+        artifact, _ = shard
+        artifact.write(b"]")
+        artifact.close()
+
+    def write(self, row, encoded_row):
+        """
+        Adds a row to the shards of its state and district, encoded_row being its JSON encoded as in the export
+        """
+        state_id, district_id = row["state_id"], row["district_id"]
+        if self.state is None or self.state[1]["state_id"] != state_id:
+            self.close_shards()
+            entry = {"state_id": state_id, "state": row["state"], "districts": []}
+            self.state = self.open_shard(f"{self.category}/{state_id}.json", entry)
+            self.states.append(entry)
+        if self.district is None or self.district[1]["district_id"] != district_id:
+            if self.district is not None:
+                self.close_shard(self.district)
+            entry = {"district_id": district_id, "district": row["district"]}
+            self.district = self.open_shard(f"{self.category}/{state_id}/{district_id}.json", entry)
+            self.state[1]["districts"].append(entry)
+        for artifact, entry in [self.state, self.district]:
+            artifact.write(b", " + encoded_row if entry["rows"] else encoded_row)
+            entry["rows"] += 1
+
+    def close_shards(self):
+        for shard in [self.district, self.state]:
+            if shard is not None:
+                self.close_shard(shard)
+        self.state = self.district = None
+
+    def get_index_key(self):
+        return f"{self.category}/index.json"
+
+    def get_previous_keys(self):
+        try:
+            body = self.client.get_object(Bucket=self.bucket, Key=self.get_index_key())["Body"].read()
+        except ClientError:
+            return set()
+        return get_shard_keys(json.loads(body))
+
+    def delete_shards(self, keys):
+        extensions = [""] + [extension for extension, _, _ in get_compressed_variants()]
+        objects = [{"Key": f"{key}{extension}"} for key in sorted(keys) for extension in extensions]
+        # At most 1000 keys can be deleted per request
+        for start in range(0, len(objects), 1000):
+            self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": objects[start : start + 1000]})
+
+    def close(self):
+        self.close_shards()
+        index = {"category": self.category, "states": self.states}
+        previous_keys = self.get_previous_keys()
+        with ExportArtifact(
+            self.client, self.bucket, self.get_index_key(), "application/json; charset=utf-8"
+        ) as artifact:
+            artifact.write(json.dumps(index).encode("UTF-8"))
+        self.delete_shards(previous_keys - get_shard_keys(index))
+
+    def abort(self):
+        for shard in [self.district, self.state]:
+            if shard is not None:
+                shard[0].abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def get_shard_keys(index):
+    """
+    Keys of the state and district shards listed in the index of a sharded export
+    """
+    keys = set()
+    for state in index["states"]:
+        keys.add(state["key"])
+        keys.update(district["key"] for district in state["districts"])
+    return keys
+
+
+def iter_export_rows(queryset, chunk_size):
+    """
+    Rows of a LifeData queryset as rendered by LifeDataSerializer, with the keys of their data merged in.
+    Rows are read with values_list() from a server side cursor, the related names being joined in SQL.
+    """
+    keys = tuple(key for key, _, _ in EXPORT_FIELDS)
+    lookups = [lookup for _, lookup, _ in EXPORT_FIELDS]
+    conversions = [(index, convert) for index, (_, _, convert) in enumerate(EXPORT_FIELDS) if convert]
+    for values in queryset.values_list(*lookups).iterator(chunk_size=chunk_size):
+        if conversions:
+            values = list(values)
+            for index, convert in conversions:
+                if values[index] is not None:
+                    values[index] = convert(values[index])
+        row = dict(zip(keys, values))
+        row.update(row["data"])
+        del row["data"]
+        yield row
+
+
+def get_data_keys(queryset):
+    """
+    Keys of the data of the rows of a LifeData queryset, in order of first appearance when the rows are read
+    ordered by state, district and id like exports
+    """
+    ids_sql, params = queryset.order_by().values("id").query.sql_with_params()
+    table = LifeData._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT keys.key FROM {table}, jsonb_object_keys({table}.data) WITH ORDINALITY AS keys(key, position) "
+            f"WHERE {table}.id IN ({ids_sql}) GROUP BY keys.key "
+            f"ORDER BY min(ARRAY[{table}.state_id, {table}.district_id, {table}.id, keys.position])",
+            params,
+        )
+        return [key for key, in cursor.fetchall()]
+
+
+def mark_categories_changed(categories):
+    """
+    Bumps the version of categories whose rows were written or deleted, so that they are exported again.
+    Called once the rows are committed, in a transaction of its own: the manifest rows stay locked only briefly
+    and always after the rows, so concurrent jobs cannot deadlock on them. An export running in between only
+    exports the category once more.
+    """
+    categories = set(categories)
+    if not categories:
+        return
+    with transaction.atomic():
+        ExportManifest.objects.bulk_create(
+            [ExportManifest(category=category) for category in categories], ignore_conflicts=True
+        )
+        ExportManifest.objects.filter(category__in=categories).update(version=F("version") + 1)
@@ -0,0 +1,58 @@
+import time
+from collections import Counter, defaultdict
+
+
+class RunTimer:
+    """
+    Accumulates the time and the queries spent in each stage of a job run.
+    Stages are switched with start(), a query is counted in the current stage when the timer is installed
+    with connection.execute_wrapper().
+    The total duration is measured on the wall clock from started_at, the stages of a run split across
+    several workers are merged with add_stages().
+    """
+
+    def __init__(self, started_at=None):
+        self.durations = defaultdict(float)
+        self.queries = Counter()
+        self.current = None
+        self.started_at = started_at or time.time()
+        self.switched = time.perf_counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries[self.current] += 1
+        return execute(sql, params, many, context)
+
+    def start(self, stage):
+        switched = time.perf_counter()
+        if self.current:
+            self.durations[self.current] += switched - self.switched
+        self.current = stage
+        self.switched = switched
+
+    def stop(self):
+        self.start(None)
+
+    def timed(self, iterable, stage):
+        """
+        Yields from iterable, counting the time spent producing each item in stage
+        """
+        self.start(stage)
+        for item in iterable:
+            yield item
+            self.start(stage)
+
+    def add_stages(self, stages):
+        for stage, values in stages.items():
+            self.durations[stage] += values["duration"]
+            self.queries[stage] += values["queries"]
+
+    @property
+    def total_duration(self):
+        return time.time() - self.started_at
+
+    def get_stages(self):
+        return {
+            stage: {"duration": round(self.durations[stage], 3), "queries": self.queries[stage]}
+            for stage in self.durations.keys() | self.queries.keys()
+            if stage
+        }
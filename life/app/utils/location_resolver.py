@@ -0,0 +1,111 @@
+from django.core.cache import cache
+
+from life.users.models import District, State
+
+LOCATION_RESOLVER_VERSION_KEY = "life_location_resolver_version"
+
+# Spellings seen in sheets that do not contain the name we have stored
+STATE_ALIASES = {
+    "ORISSA": "ODISHA",
+    "PONDICHERRY": "PUDUCHERRY",
+    "PONDY": "PUDUCHERRY",
+    "UTTARANCHAL": "UTTARAKHAND",
+    "J&K": "JAMMU & KASHMIR",
+    "JAMMU AND KASHMIR": "JAMMU & KASHMIR",
+    "ANDAMAN & NICOBAR": "ANDAMAN AND NICOBAR",
+    "NCT OF DELHI": "DELHI",
+    "NEW DELHI": "DELHI",
+    "AP": "ANDHRA PRADESH",
+    "MP": "MADHYA PRADESH",
+    "UP": "UTTAR PRADESH",
+    "TN": "TAMIL NADU",
+    "WB": "WEST BENGAL",
+}
+
+DISTRICT_ALIASES = {
+    "ALLEPPEY": "ALAPPUZHA",
+    "QUILON": "KOLLAM",
+    "TRICHUR": "THRISSUR",
+    "PALGHAT": "PALAKKAD",
+    "CANNANORE": "KANNUR",
+    "CALICUT": "KOZHIKODE",
+    "TRIVANDRUM": "THIRUVANANTHAPURAM",
+    "COCHIN": "ERNAKULAM",
+    "KOCHI": "ERNAKULAM",
+    "KASARGOD": "KASARAGOD",
+    "KASARGODE": "KASARAGOD",
+    "GURUGRAM": "GURGAON",
+    "BOMBAY": "MUMBAI",
+    "CALCUTTA": "KOLKATA",
+    "MADRAS": "CHENNAI",
+    "PRAYAGRAJ": "ALLAHABAD",
+    "AYODHYA": "FAIZABAD",
+}
+
+
+def normalize_name(name):
+    return " ".join(name.split()).upper()
+
+
+class LocationResolver:
+    """
+    Resolves state and district names from sheets against the State and District tables,
+    which are loaded once. A name resolves to the state or district whose name matches it exactly,
+    otherwise to the first one (by id) whose name contains it, like a name__icontains lookup did.
+    Results are memoised, so each distinct spelling is matched only once.
+    """
+
+    def __init__(self, version=None):
+        self.version = version
+        self.states = [(normalize_name(state.name), state) for state in State.objects.order_by("id")]
+        self.districts = {}
+        for district in District.objects.order_by("id"):
+            self.districts.setdefault(district.state_id, []).append((normalize_name(district.name), district))
+        self.resolved_states = {}
+        self.resolved_districts = {}
+
+    @staticmethod
+    def match(names, name, aliases):
+        for candidate in (name, aliases.get(name)):
+            if not candidate:
+                continue
+            for obj_name, obj in names:
+                if obj_name == candidate:
+                    return obj
+            for obj_name, obj in names:
+                if candidate in obj_name:
+                    return obj
+        return None
+
+    def get_state(self, name):
+        name = normalize_name(name)
+        if name not in self.resolved_states:
+            self.resolved_states[name] = self.match(self.states, name, STATE_ALIASES)
+        return self.resolved_states[name]
+
+    def get_district(self, name, state):
+        key = (state.id, normalize_name(name))
+        if key not in self.resolved_districts:
+            self.resolved_districts[key] = self.match(self.districts.get(state.id, []), key[1], DISTRICT_ALIASES)
+        return self.resolved_districts[key]
+
+
+_location_resolver = None
+
+
+def get_location_resolver():
+    """
+    Returns the resolver of this process, reloading it if the State or District tables changed since it was built
+    """
+    global _location_resolver
+    version = cache.get(LOCATION_RESOLVER_VERSION_KEY, 0)
+    if _location_resolver is None or _location_resolver.version != version:
+        _location_resolver = LocationResolver(version)
+    return _location_resolver
+
+
+def invalidate_location_resolver():
+    try:
+        cache.incr(LOCATION_RESOLVER_VERSION_KEY)
+    except ValueError:
+        cache.set(LOCATION_RESOLVER_VERSION_KEY, 1, None)
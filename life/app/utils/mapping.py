@@ -0,0 +1,127 @@
+import hashlib
+import json
+import re
+import unicodedata
+from itertools import chain
+from operator import itemgetter
+
+# Headers used in submitted sheets for the required keys, Hindi and abbreviated ones included.
+# They are matched ignoring case and spacing, and only when the sheet does not have the key itself, so that sheets
+# which would be rejected for a missing header can be read. Optional columns keep their header unless the mapping
+# profile of the job aliases them: renaming them for every job would change the data and the exported columns of
+# sheets that are already ingested.
+DEFAULT_ALIASES = {
+    "id": ["sr no", "sr. no.", "s.no", "s. no.", "serial number", "क्रम संख्या", "क्रमांक"],
+    "title": ["name", "resource name", "नाम"],
+    "category": ["type", "resource category", "श्रेणी", "प्रकार"],
+    "phone_1": [
+        "phone",
+        "phone no",
+        "phone number",
+        "mobile",
+        "mobile no",
+        "contact",
+        "contact no",
+        "contact number",
+        "फ़ोन",
+        "फ़ोन नंबर",
+        "मोबाइल",
+        "मोबाइल नंबर",
+        "संपर्क",
+    ],
+    "district": ["dist", "dist.", "जिला", "ज़िला"],
+    "state": ["राज्य"],
+}
+
+NORMALIZERS = {
+    "strip": str.strip,
+    "lower": str.lower,
+    "upper": str.upper,
+    "title": str.title,
+    "collapse_spaces": lambda value: " ".join(value.split()),
+    "digits": lambda value: re.sub(r"\D", "", value),
+}
+
+
+def get_mapping_hash(profile):
+    """
+    Fingerprint of a mapping profile, so that a source is ingested again when the profile of its job changes.
+    Empty for the default profile.
+    """
+    if not profile:
+        return ""
+    payload = json.dumps(profile, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def normalize_header(name):
+    return " ".join(unicodedata.normalize("NFC", name).casefold().split())
+
+
+def compose(functions):
+    def normalize(value):
+        for function in functions:
+            value = function(value)
+        return value
+
+    return normalize
+
+
+class ColumnMapping:
+    """
+    Extracts the data of a row as a dict, with a fixed set of index reads and the normalizers of its keys
+    """
+
+    def __init__(self, columns, normalizers):
+        self.keys = tuple(columns)
+        indexes = tuple(columns.values())
+        if len(indexes) == 1:
+            self.getter = lambda row: (row[indexes[0]],)
+        else:
+            self.getter = itemgetter(*indexes) if indexes else lambda row: ()
+        self.normalizers = tuple(normalizers.items())
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def __call__(self, row):
+        data = dict(zip(self.keys, self.getter(row)))
+        for key, normalize in self.normalizers:
+            data[key] = normalize(data[key])
+        return data
+
+
+def compile_mapping(header, keys, profile=None):
+    """
+    Compiles the mapping of the columns of a source from its header and the mapping profile of its job:
+    {"aliases": {key: [header]}, "columns": {key: column index}, "normalizers": {key: [normalizer]}}.
+    Columns are mapped by their header, a header that is not one of keys is mapped to the key it is an alias of.
+    Column bindings take precedence over headers. Columns with a blank header are left out.
+    """
+    profile = profile or {}
+    aliases = {normalize_header(key): key for key in keys}
+    for key, names in chain(DEFAULT_ALIASES.items(), profile.get("aliases", {}).items()):
+        for name in names:
+            aliases[normalize_header(name)] = key
+    columns = {}
+    for index, name in enumerate(header):
+        if name.strip():
+            columns[name.strip()] = index
+    for name, index in list(columns.items()):
+        key = aliases.get(normalize_header(name))
+        if key and key not in columns:
+            del columns[name]
+            columns[key] = index
+    for key, index in profile.get("columns", {}).items():
+        if not 0 <= index < len(header):
+            raise Exception(f"Column {index} bound to {key} is not in the header ")
+        columns = {name: i for name, i in columns.items() if i != index and name != key}
+        columns[key] = index
+    normalizers = {}
+    for key, names in profile.get("normalizers", {}).items():
+        for name in names:
+            if name not in NORMALIZERS:
+                raise Exception(f"Normalizer {name} is not defined ")
+        if key in columns:
+            normalizers[key] = compose([NORMALIZERS[name] for name in names])
+    return ColumnMapping(columns, normalizers)
@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import tempfile
+
+import aiohttp
+from django.conf import settings
+from django.core.cache import cache
+
+from life.app.utils.sources import (
+    DOWNLOAD_CHUNK_SIZE,
+    SPOOL_MAX_SIZE,
+    DownloadedSource,
+    fetch_source,
+    get_conditional_headers,
+)
+
+NOT_MODIFIED = "not_modified"
+DOWNLOADED = "downloaded"
+FAILED = "failed"
+
+RETRY_DELAY = 1  # in Seconds, doubled on every retry
+
+
+def get_prefetch_cache_key(job_id):
+    return f"life_prefetched_source_{job_id}"
+
+
+async def prefetch_source(session, job):
+    """
+    Downloads the source of a job, see download_source. Returns None for sources not downloaded within
+    LIFE_PREFETCH_TIMEOUT, retries included: nothing sends heartbeats for the claimed jobs while they are
+    prefetched, the worker downloads them instead and keeps the job alive while it does.
+    """
+    try:
+        return await asyncio.wait_for(download_source(session, job), settings.LIFE_PREFETCH_TIMEOUT)
+    except asyncio.TimeoutError:
+        return None
+
+
+async def download_source(session, job):
+    """
+    Downloads the source of a job, retrying connection errors, timeouts and server errors.
+    Returns None for sources larger than LIFE_PREFETCH_MAX_SIZE, they are left to the worker to download.
+    """
+    headers = get_conditional_headers(job)
+    timeout = aiohttp.ClientTimeout(sock_connect=settings.LIFE_PREFETCH_CONNECT_TIMEOUT, sock_read=job.read_timeout)
+    max_size = job.max_download_size * 1024 * 1024
+    max_prefetched_size = settings.LIFE_PREFETCH_MAX_SIZE * 1024 * 1024
+    for attempt in range(settings.LIFE_PREFETCH_RETRIES + 1):
+        try:
+            async with session.get(job.file_url, headers=headers, timeout=timeout) as response:
+                if response.status == 304:
+                    return {"status": NOT_MODIFIED}
+                response.raise_for_status()
+                body = bytearray()
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    body += chunk
+                    if len(body) > max_size:
+                        return {
+                            "status": FAILED,
+                            "error": f"File is larger than the maximum allowed size of {job.max_download_size} MB ",
+                        }
+                    if len(body) > max_prefetched_size:
+                        return None
+                return {
+                    "status": DOWNLOADED,
+                    "body": bytes(body),
+                    "etag": response.headers.get("ETag", ""),
+                    "last_modified": response.headers.get("Last-Modified", ""),
+                    "content_type": response.headers.get("Content-Type", ""),
+                }
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            client_error = isinstance(e, aiohttp.ClientResponseError) and e.status < 500
+            if client_error or attempt == settings.LIFE_PREFETCH_RETRIES:
+                return {"status": FAILED, "error": str(e) or e.__class__.__name__}
+            await asyncio.sleep(RETRY_DELAY * 2 ** attempt)
+
+
+async def prefetch_all(jobs, on_prefetched):
+    connector = aiohttp.TCPConnector(
+        limit=settings.LIFE_PREFETCH_CONNECTIONS, limit_per_host=settings.LIFE_PREFETCH_CONNECTIONS_PER_HOST
+    )
+    async with aiohttp.ClientSession(connector=connector) as session:
+
+        async def prefetch(job):
+            prefetched = await prefetch_source(session, job)
+            if prefetched:
+                cache.set(get_prefetch_cache_key(job.id), prefetched, settings.LIFE_PREFETCH_CACHE_TIMEOUT)
+            if on_prefetched:
+                on_prefetched(job)
+
+        await asyncio.gather(*(prefetch(job) for job in jobs))
+
+
+def prefetch_sources(jobs, on_prefetched=None):
+    """
+    Downloads the sources of the jobs concurrently and hands them to the workers through the cache.
+    on_prefetched is called with each job as soon as its source has been prefetched.
+    """
+    if jobs:
+        asyncio.run(prefetch_all(jobs, on_prefetched))
+
+
+def get_source(job, heartbeat=None):
+    """
+    Returns the source prefetched for a job, or downloads it if it was not prefetched, see fetch_source.
+    Returns None if the source has not been modified.
+    """
+    key = get_prefetch_cache_key(job.id)
+    prefetched = cache.get(key)
+    if prefetched is None:
+        return fetch_source(job, heartbeat=heartbeat)
+    cache.delete(key)
+    if prefetched["status"] == NOT_MODIFIED:
+        return None
+    if prefetched["status"] == FAILED:
+        raise Exception(prefetched["error"])
+    body = prefetched["body"]
+    file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    file.write(body)
+    return DownloadedSource(
+        file,
+        hashlib.sha256(body).hexdigest(),
+        etag=prefetched["etag"],
+        last_modified=prefetched["last_modified"],
+        size=len(body),
+        content_type=prefetched["content_type"],
+        url=job.file_url,
+    )
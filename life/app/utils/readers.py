@@ -0,0 +1,155 @@
+import codecs
+import csv
+import datetime
+import gzip
+import json
+from urllib.parse import urlparse
+
+import openpyxl
+
+from life.app.utils.sources import DOWNLOAD_CHUNK_SIZE
+
+CSV = "csv"
+NDJSON = "ndjson"
+XLSX = "xlsx"
+
+CONTENT_TYPES = {
+    "text/csv": (CSV, False),
+    "application/csv": (CSV, False),
+    "application/gzip": (CSV, True),
+    "application/x-gzip": (CSV, True),
+    "application/x-ndjson": (NDJSON, False),
+    "application/ndjson": (NDJSON, False),
+    "application/jsonl": (NDJSON, False),
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": (XLSX, False),
+}
+
+EXTENSIONS = {
+    ".csv": (CSV, False),
+    ".csv.gz": (CSV, True),
+    ".ndjson": (NDJSON, False),
+    ".jsonl": (NDJSON, False),
+    ".ndjson.gz": (NDJSON, True),
+    ".jsonl.gz": (NDJSON, True),
+    ".gz": (CSV, True),
+    ".xlsx": (XLSX, False),
+}
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZIP_MAGIC = b"PK\x03\x04"
+
+
+def get_source_format(source):
+    """
+    Returns the format of a downloaded source and whether it is gzipped, from its extension or content type.
+    Sources served with a generic content type and no known extension are recognised from their first bytes.
+    """
+    path = urlparse(source.url).path.lower()
+    for extension, source_format in EXTENSIONS.items():
+        if path.endswith(extension):
+            return source_format
+    content_type = source.content_type.split(";")[0].strip().lower()
+    if content_type in CONTENT_TYPES:
+        return CONTENT_TYPES[content_type]
+    source.file.seek(0)
+    head = source.file.read(len(ZIP_MAGIC))
+    if head.startswith(GZIP_MAGIC):
+        return CSV, True
+    if head.startswith(ZIP_MAGIC):
+        return XLSX, False
+    return CSV, False
+
+
+def iter_gunzipped_chunks(source, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    source.file.seek(0)
+    with gzip.GzipFile(fileobj=source.file, mode="rb") as file:
+        yield from iter(lambda: file.read(chunk_size), b"")
+
+
+def iter_decoded_lines(chunks):
+    """
+    Decodes a file chunk by chunk and yields complete lines (with their line endings),
+    so that only one chunk of the file is held in memory at a time.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.splitlines(keepends=True)
+        # A trailing "\r" may be the first half of a "\r\n" split across chunks
+        pending = lines.pop() if lines and not lines[-1].endswith("\n") else ""
+        yield from lines
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield from pending.splitlines(keepends=True)
+
+
+def read_csv_rows(open_chunks):
+    return csv.reader(iter_decoded_lines(open_chunks()), delimiter=",")
+
+
+def to_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+
+def read_ndjson_rows(open_chunks):
+    """
+    Yields a header with the keys of all the objects, in order of appearance, then one row per object.
+    The file is read twice so that objects with different keys do not have to be held in memory.
+    """
+    header = {}
+    for line in iter_decoded_lines(open_chunks()):
+        if line.strip():
+            header.update(dict.fromkeys(json.loads(line)))
+    yield list(header)
+    for line in iter_decoded_lines(open_chunks()):
+        if line.strip():
+            obj = json.loads(line)
+            yield [to_cell(obj.get(key)) for key in header]
+
+
+def to_xlsx_cell(value):
+    if value is None:
+        return ""
+    # Phone numbers and ids are often stored as numbers
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def read_xlsx_rows(source):
+    """
+    Yields the rows of the first sheet of a workbook, the workbook is read in read only mode row by row
+    """
+    source.file.seek(0)
+    workbook = openpyxl.load_workbook(source.file, read_only=True, data_only=True)
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            cells = [to_xlsx_cell(value) for value in row]
+            # Formatted but empty rows are common at the end of sheets
+            if any(cells):
+                yield cells
+    finally:
+        workbook.close()
+
+
+def read_source_rows(source):
+    """
+    Yields the rows of a downloaded source as lists of strings, the first row being the header
+    """
+    source_format, compressed = get_source_format(source)
+    if source_format == XLSX:
+        return read_xlsx_rows(source)
+
+    def open_chunks():
+        return iter_gunzipped_chunks(source) if compressed else source.iter_chunks()
+
+    if source_format == NDJSON:
+        return read_ndjson_rows(open_chunks)
+    return read_csv_rows(open_chunks)
@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.core.cache import cache
+
+
+def get_shard_cache_key(job_id, generation, index):
+    return f"life_source_shard_{job_id}_{generation}_{index}"
+
+
+def split_csv(chunks, shard_size):
+    """
+    Splits a CSV read chunk by chunk into shards of at least shard_size bytes, cut after a complete record.
+    A newline ends a record only when an even number of quotes precedes it, quoted fields may contain newlines.
+    Quotes and newlines never occur inside multi-byte UTF-8 characters, so the bytes do not have to be decoded.
+    Yields (header, number of the first row of the shard, shard), the header being row 1.
+    """
+    header = None
+    buffer = bytearray()
+    scanned = 0  # Bytes of the buffer whose quotes have been counted
+    quoted = False
+    records = 0
+    first_row = 2
+    for chunk in chunks:
+        buffer += chunk
+        newline = buffer.find(b"\n", scanned)
+        while newline != -1:
+            quoted ^= buffer.count(b'"', scanned, newline) % 2 == 1
+            scanned = newline + 1
+            if not quoted:
+                records += 1
+                if header is None:
+                    header = bytes(buffer[:scanned])
+                    del buffer[:scanned]
+                    scanned = 0
+                elif scanned >= shard_size:
+                    yield header, first_row, bytes(buffer[:scanned])
+                    del buffer[:scanned]
+                    scanned = 0
+                    first_row = records + 1
+            newline = buffer.find(b"\n", scanned)
+        quoted ^= buffer.count(b'"', scanned) % 2 == 1
+        scanned = len(buffer)
+    if header is None:
+        return
+    if buffer:
+        yield header, first_row, bytes(buffer)
+
+
+def store_shards(job, chunks):
+    """
+    Splits a CSV source into shards of LIFE_SHARD_SIZE MB stored in the cache for the workers,
+    each shard starting with the header. Returns the number of the first row of each shard.
+    The shards are kept until the run is finalized, so that a redelivered shard task can read its shard again.
+    """
+    first_rows = []
+    for index, (header, first_row, shard) in enumerate(split_csv(chunks, settings.LIFE_SHARD_SIZE * 1024 * 1024)):
+        # Unlike set, add reports whether the shard was stored, the cache may drop it silently
+        if not cache.add(
+            get_shard_cache_key(job.id, job.generation, index), header + shard, settings.CELERY_TASK_SOFT_TIME_LIMIT
+        ):
+            delete_shards(job.id, job.generation, index)
+            raise Exception(f"Shard {index} of the source could not be stored ")
+        first_rows.append(first_row)
+    return first_rows
+
+
+def get_shard(job_id, generation, index):
+    shard = cache.get(get_shard_cache_key(job_id, generation, index))
+    if shard is None:
+        raise Exception(f"Shard {index} of the source has expired ")
+    return shard
+
+
+def delete_shards(job_id, generation, count):
+    cache.delete_many([get_shard_cache_key(job_id, generation, index) for index in range(count)])
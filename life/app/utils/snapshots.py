@@ -0,0 +1,182 @@
+import gzip
+import os
+import shutil
+import tempfile
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+
+import boto3
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.utils.timezone import now
+
+from life.app.utils.sources import DOWNLOAD_CHUNK_SIZE, SPOOL_MAX_SIZE, DownloadedSource
+
+
+class LocalSnapshotStore:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def get_path(self, key):
+        return os.path.join(self.directory, key)
+
+    def exists(self, key):
+        return os.path.exists(self.get_path(key))
+
+    def save(self, key, file, heartbeat=None):
+        os.makedirs(self.directory, exist_ok=True)
+        # Written under a temporary name first so that a partial snapshot is never read
+        with tempfile.NamedTemporaryFile(dir=self.directory, delete=False) as temporary_file:
+            shutil.copyfileobj(file, temporary_file)
+        os.replace(temporary_file.name, self.get_path(key))
+
+    def open(self, key):
+        return open(self.get_path(key), "rb")
+
+    def list(self):
+        """
+        Yields the key and the modification time of every snapshot
+        """
+        if not os.path.isdir(self.directory):
+            return
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".gz"):
+                yield entry.name, datetime.fromtimestamp(entry.stat().st_mtime, timezone.utc)
+
+    def delete(self, key):
+        os.remove(self.get_path(key))
+
+
+class S3SnapshotStore:
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.LIFE_S3_ENDPOINT,
+            aws_access_key_id=settings.LIFE_S3_ACCESS_KEY,
+            aws_secret_access_key=settings.LIFE_S3_SECRET,
+        )
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError:
+            return False
+        return True
+
+    def save(self, key, file, heartbeat=None):
+        callback = (lambda transferred: heartbeat()) if heartbeat else None
+        self.client.upload_fileobj(file, self.bucket, key, Callback=callback)
+
+    def open(self, key):
+        return self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+
+    def list(self):
+        for page in self.client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket):
+            for obj in page.get("Contents", []):
+                if obj["Key"].endswith(".gz"):
+                    yield obj["Key"], obj["LastModified"]
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+
+def snapshots_enabled():
+    return settings.LIFE_SNAPSHOT_STORAGE in ("s3", "local")
+
+
+def get_snapshot_store():
+    """
+    Store configured with LIFE_SNAPSHOT_STORAGE, None when snapshots are disabled
+    """
+    if settings.LIFE_SNAPSHOT_STORAGE == "s3":
+        return S3SnapshotStore(settings.LIFE_SNAPSHOT_BUCKET)
+    if settings.LIFE_SNAPSHOT_STORAGE == "local":
+        return LocalSnapshotStore(settings.LIFE_SNAPSHOT_DIR)
+    return None
+
+
+def get_snapshot_key(sha256):
+    return f"{sha256}.gz"
+
+
+def save_snapshot(source, heartbeat=None):
+    """
+    Stores the gzipped body of a downloaded source, keyed by its hash so that identical bodies are stored once.
+    Returns whether a snapshot of the source is stored. heartbeat is called while it is compressed and uploaded.
+    """
+    store = get_snapshot_store()
+    if not store:
+        return False
+    key = get_snapshot_key(source.sha256)
+    if store.exists(key):
+        return True
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as file:
+        with gzip.GzipFile(fileobj=file, mode="wb") as compressed_file:
+            for chunk in source.iter_chunks():
+                if heartbeat:
+                    heartbeat()
+                compressed_file.write(chunk)
+        file.seek(0)
+        store.save(key, file, heartbeat)
+    return True
+
+
+def prune_snapshots(kept_hashes):
+    """
+    Deletes the snapshots older than LIFE_SNAPSHOT_RETENTION days, except those of the hashes in kept_hashes.
+    Returns the number of snapshots deleted.
+    """
+    store = get_snapshot_store()
+    if not store:
+        return 0
+    kept_keys = {get_snapshot_key(sha256) for sha256 in kept_hashes}
+    oldest_kept = now() - timedelta(days=settings.LIFE_SNAPSHOT_RETENTION)
+    expired = [key for key, modified in store.list() if key not in kept_keys and modified < oldest_kept]
+    for key in expired:
+        store.delete(key)
+    return len(expired)
+
+
+def check_snapshot(job):
+    """
+    Raises when the last processed source of a job cannot be loaded from its snapshot, returns the store otherwise
+    """
+    store = get_snapshot_store()
+    if not store:
+        raise Exception("Snapshots are not enabled ")
+    if not job.source_hash:
+        raise Exception("The source of the job has not been processed yet ")
+    if not store.exists(get_snapshot_key(job.source_hash)):
+        raise Exception("No snapshot of the last processed source is stored ")
+    return store
+
+
+def load_snapshot(job, heartbeat=None):
+    """
+    Returns the last processed source of a job from its snapshot, as if it had just been downloaded.
+    heartbeat is called for every chunk decompressed.
+    """
+    store = check_snapshot(job)
+    file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    size = 0
+    try:
+        with closing(store.open(get_snapshot_key(job.source_hash))) as snapshot:
+            with gzip.GzipFile(fileobj=snapshot, mode="rb") as compressed_file:
+                for chunk in iter(lambda: compressed_file.read(DOWNLOAD_CHUNK_SIZE), b""):
+                    if heartbeat:
+                        heartbeat()
+                    size += len(chunk)
+                    file.write(chunk)
+    except Exception:
+        file.close()
+        raise
+    return DownloadedSource(
+        file,
+        job.source_hash,
+        etag=job.source_etag,
+        last_modified=job.source_last_modified,
+        size=size,
+        content_type=job.source_content_type,
+        url=job.file_url,
+    )
@@ -0,0 +1,218 @@
+import hashlib
+import ipaddress
+import socket
+import tempfile
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util.connection import create_connection
+
+from life.app.utils.mapping import get_mapping_hash
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024  # in Bytes
+SPOOL_MAX_SIZE = 4 * 1024 * 1024  # in Bytes, larger downloads are spooled to disk
+
+
+class TimeBudgetExceeded(Exception):
+    pass
+
+
+def check_deadline(deadline):
+    """
+    Raises TimeBudgetExceeded once deadline, a time.monotonic() value, has passed. None is no deadline.
+    """
+    if deadline is not None and time.monotonic() > deadline:
+        raise TimeBudgetExceeded("The time budget ran out ")
+
+
+class DeadlineFile:
+    """
+    File whose reads raise TimeBudgetExceeded once the deadline has passed. Readers read their file in chunks,
+    so the reads they make before yielding their first row, like loading a workbook, are bounded by it too.
+    """
+
+    def __init__(self, file, deadline):
+        self.file = file
+        self.deadline = deadline
+
+    def read(self, *args):
+        check_deadline(self.deadline)
+        return self.file.read(*args)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+class DownloadedSource:
+    """
+    Body of a job source file, kept in a temporary file so that it can be hashed before being parsed
+    """
+
+    def __init__(self, file, sha256, etag="", last_modified="", size=0, content_type="", url=""):
+        self.file = file
+        self.sha256 = sha256
+        self.etag = etag
+        self.last_modified = last_modified
+        self.size = size
+        self.content_type = content_type
+        self.url = url
+
+    def iter_chunks(self, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        self.file.seek(0)
+        return iter(lambda: self.file.read(chunk_size), b"")
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def get_public_address(host, port):
+    """
+    Resolves a host given by a user and returns the address to connect to,
+    raises an exception unless all of its addresses are public
+    """
+    try:
+        addresses = socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)
+    except socket.gaierror:
+        raise Exception(f"Could not resolve {host} ")
+    for address in addresses:
+        if not ipaddress.ip_address(address[4][0]).is_global:
+            raise Exception(f"{host} is not a public host ")
+    return addresses[0][4][0]
+
+
+def check_public_url(url):
+    """
+    Raises an exception unless the url is http(s) and its host only resolves to public addresses,
+    for urls given by users that must not reach internal services
+    """
+    parsed_url = urlparse(url)
+    if parsed_url.scheme not in ("http", "https") or not parsed_url.hostname:
+        raise Exception("Only http and https urls are supported ")
+    get_public_address(parsed_url.hostname, parsed_url.port or 80)
+
+
+class PublicAddressMixin:
+    """
+    Connects only to public addresses. The address checked is the one connected to, so that neither a redirect
+    nor a host resolving to another address on a second lookup can reach internal services.
+    """
+
+    def _new_conn(self):
+        address = get_public_address(self._dns_host, self.port)
+        extra_kw = {}
+        if self.source_address:
+            extra_kw["source_address"] = self.source_address
+        if self.socket_options:
+            extra_kw["socket_options"] = self.socket_options
+        try:
+            return create_connection((address, self.port), self.timeout, **extra_kw)
+        except socket.timeout:
+            raise ConnectTimeoutError(self, f"Connection to {self.host} timed out ")
+        except OSError as e:
+            raise NewConnectionError(self, f"Failed to establish a new connection: {e} ")
+
+
+class PublicHTTPConnection(PublicAddressMixin, HTTPConnection):
+    pass
+
+
+class PublicHTTPSConnection(PublicAddressMixin, HTTPSConnection):
+    pass
+
+
+class PublicHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = PublicHTTPConnection
+
+
+class PublicHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = PublicHTTPSConnection
+
+
+class PublicAddressAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": PublicHTTPConnectionPool, "https": PublicHTTPSConnectionPool}
+
+
+def get_public_session():
+    """
+    Session for urls given by users, every connection it makes, redirects included, is to a public address
+    """
+    session = requests.Session()
+    # Proxies from the environment would be connected to instead of the host
+    session.trust_env = False
+    session.mount("http://", PublicAddressAdapter())
+    session.mount("https://", PublicAddressAdapter())
+    return session
+
+
+def get_conditional_headers(job):
+    """
+    Validators of the last download of the source, so that the server can answer that it has not been modified.
+    None are sent once the mapping profile of the job changed, the source has to be ingested again.
+    """
+    headers = {}
+    if job.mapping_hash != get_mapping_hash(job.mapping_profile):
+        return headers
+    if job.source_etag:
+        headers["If-None-Match"] = job.source_etag
+    if job.source_last_modified:
+        headers["If-Modified-Since"] = job.source_last_modified
+    return headers
+
+
+def fetch_source(job, session=None, deadline=None, heartbeat=None):
+    """
+    Downloads the source file of a job, sending the validators of the last download.
+    Returns None if the server answered that the file has not been modified.
+    The file is downloaded with session when given, e.g. a get_public_session() for urls given by users.
+    With a deadline, a time.monotonic() value, TimeBudgetExceeded is raised if the download does not complete by then.
+    heartbeat is called for every chunk downloaded.
+    """
+    headers = get_conditional_headers(job)
+    max_size = job.max_download_size * 1024 * 1024
+    get = session.get if session else requests.get
+    timeout = job.read_timeout
+    if deadline is not None:
+        check_deadline(deadline)
+        timeout = min(timeout, deadline - time.monotonic())
+    with get(job.file_url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        sha256 = hashlib.sha256()
+        size = 0
+        try:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                check_deadline(deadline)
+                if heartbeat:
+                    heartbeat()
+                size += len(chunk)
+                if size > max_size:
+                    raise Exception(f"File is larger than the maximum allowed size of {job.max_download_size} MB ")
+                sha256.update(chunk)
+                file.write(chunk)
+        except Exception:
+            file.close()
+            raise
+        return DownloadedSource(
+            file,
+            sha256.hexdigest(),
+            etag=response.headers.get("ETag", ""),
+            last_modified=response.headers.get("Last-Modified", ""),
+            size=size,
+            content_type=response.headers.get("Content-Type", ""),
+            url=job.file_url,
+        )